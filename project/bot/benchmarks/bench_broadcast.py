@@ -0,0 +1,67 @@
+"""Бенчмарк волны рассылки: BroadcastDispatcher против имитации Telegram с задержкой и ответами RetryAfter.
+
+Волна не должна идти заметно дольше, чем требует лимит: seconds ≈ expected_seconds, lag близок к нулю.
+
+Запуск из каталога project/bot:
+    python benchmarks/bench_broadcast.py --channels 10000 --rate 1000
+    python benchmarks/bench_broadcast.py --channels 1000 --rate 25 --retry-share 0.01
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import random
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from aiogram.exceptions import TelegramRetryAfter  # noqa: E402
+from aiogram.methods import SendMessage  # noqa: E402
+
+from broadcast import BroadcastDispatcher, BROADCAST_BURST, BROADCAST_WORKERS  # noqa: E402
+
+
+async def run_wave(channels, rate, latency, retry_share, retry_after, workers, seed):
+    rng = random.Random(seed)
+    dispatcher = BroadcastDispatcher(rate=rate, burst=BROADCAST_BURST, workers=workers)
+
+    def job(chat_id):
+        async def deliver():
+            await asyncio.sleep(latency * rng.uniform(0.5, 1.5))
+            if rng.random() < retry_share:
+                raise TelegramRetryAfter(SendMessage(chat_id=chat_id, text=''), 'Flood control exceeded',
+                                         retry_after)
+            return True
+        return chat_id, deliver
+
+    return await dispatcher.wave(job(chat_id) for chat_id in range(channels))
+
+
+def main():
+    args = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    args.add_argument('--channels', type=int, default=10000, help='Каналов в волне')
+    args.add_argument('--rate', type=float, default=1000, help='Общий лимит, сообщений в секунду')
+    args.add_argument('--latency', type=float, default=0.05, help='Средняя задержка ответа Telegram, с')
+    args.add_argument('--retry-share', type=float, default=0.0, help='Доля ответов TelegramRetryAfter')
+    args.add_argument('--retry-after', type=int, default=1, help='retry_after в этих ответах, с')
+    args.add_argument('--workers', type=int, default=BROADCAST_WORKERS, help='Одновременных отправок')
+    args.add_argument('--seed', type=int, default=1)
+    args.add_argument('--output', help='Файл для JSON (по умолчанию stdout)')
+    args = args.parse_args()
+
+    logging.disable(logging.WARNING)
+    report = asyncio.run(run_wave(args.channels, args.rate, args.latency, args.retry_share, args.retry_after,
+                                  args.workers, args.seed))
+    report.update(rate=args.rate, latency=args.latency, retry_share=args.retry_share)
+
+    output = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(output)
+    else:
+        print(output)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,139 @@
+"""Генерация страниц в разметке сайта приюта и локальный сервер-заглушка для бенчмарков"""
+import asyncio
+import hashlib
+import os
+import random
+from collections import Counter
+
+from aiohttp import web
+
+FIXTURES_DIR = os.path.join(os.path.dirname(__file__), 'fixtures')
+LISTING_PATH = '/find-your-best-friend-today/page/{}/'
+
+NAMES = ["Спартак", "Мила", "Бублик", "Ласка", "Граф", "Тучка", "Рыжик", "Соня", "Барон", "Пуговка"]
+AGES = ["5 лет", "2 года", "8 месяцев", "", "10 лет", "1 год", "3 года", "4 года", "6 лет", "3 месяца"]
+SEXES = ["Мальчик", "Девочка"]
+
+CARD_TEMPLATE = '''          <div role="listitem" class="w-dyn-item">
+            <div class="card zs_card">
+              <a href="{link}" class="card__title w-inline-block">
+                <div data-bg="{photo}" class="lazyload card__image"></div>
+                <h2 class="card__name">{name}</h2>
+              </a>
+              <div class="card__info">
+                <div class="card__row"><div class="card__label">Возраст</div><div class="card__value">{age}</div></div>
+                <div class="card__row"><div class="card__label">Пол</div><div class="card__value">{sex}</div></div>
+              </div>
+              <a href="{link}" class="button card__button w-button">Познакомиться</a>
+            </div>
+          </div>'''
+
+
+def load_fixture(name):
+    """Прочитать записанную страницу из fixtures/"""
+    with open(os.path.join(FIXTURES_DIR, name), encoding='utf-8') as f:
+        return f.read()
+
+
+def render_card(index, base_url='https://less-homeless.com', version=0):
+    """Карточка животного с уникальным именем и ссылкой; version меняет содержимое карточки"""
+    slug = f'pet-{index}'
+    return CARD_TEMPLATE.format(
+        link=f'{base_url}/pets/{slug}/',
+        photo=f'{base_url}/wp-content/uploads/{slug}-{version}.jpg',
+        name=f'{NAMES[index % len(NAMES)]} {index}',
+        age=AGES[index % len(AGES)],
+        sex=SEXES[index % len(SEXES)],
+    )
+
+
+def render_listing(cards, page=1, pages=1, base_url='https://less-homeless.com', first_index=0, versions=None):
+    """Страница списка: записанная разметка, в которой карточки заменены на cards сгенерированных"""
+    template = load_fixture('listing_page.html')
+    head, rest = template.split('<div role="list" class="cards w-dyn-items">', 1)
+    tail = rest[rest.index('    <nav class="navigation pagination"'):]
+    versions = versions or {}
+    body = '\n'.join(render_card(i, base_url, versions.get(i, 0)) for i in range(first_index, first_index + cards))
+    pagination = '\n'.join(
+        f'        <a class="page-numbers" href="{base_url}{LISTING_PATH.format(p)}">{p}</a>' for p in range(1, pages + 1)
+    )
+    tail = tail[:tail.index('<div class="nav-links">') + len('<div class="nav-links">')] + '\n' + pagination + \
+        tail[tail.index('      </div>\n    </nav>'):]
+    return f'{head}<div role="list" class="cards w-dyn-items">\n{body}\n      </div>\n    </div>\n{tail}'
+
+
+def render_detail(slug):
+    """Страница животного на основе записанной"""
+    return load_fixture('detail_page.html').replace('Спартак', slug)
+
+
+class SiteState:
+    """Настройки и счётчики сервера-заглушки; меняются между обходами без пересоздания приложения"""
+
+    def __init__(self, pages, per_page, latency=0.0, error_rate=0.0, seed=0):
+        self.pages = pages
+        self.per_page = per_page
+        self.latency = latency          # Средняя задержка ответа, секунд (±50%)
+        self.error_rate = error_rate    # Доля ответов 503
+        self.random = random.Random(seed)
+        self.versions = {}              # Номер карточки → версия содержимого
+        self.requests = Counter()       # listing, detail, not_modified, errors
+
+    @property
+    def total_requests(self):
+        return self.requests['listing'] + self.requests['detail']
+
+    def churn(self, share):
+        """Изменить содержимое доли share всех карточек; возвращает число изменённых"""
+        total = self.pages * self.per_page
+        changed = self.random.sample(range(total), round(total * share))
+        for index in changed:
+            self.versions[index] = self.versions.get(index, 0) + 1
+        return len(changed)
+
+
+def make_app(pages=16, per_page=12, latency=0.0, error_rate=0.0, seed=0):
+    """Сервер-заглушка: pages страниц списка по per_page карточек и страницы животных.
+
+    Ответы поддерживают ETag/If-None-Match; состояние и счётчики запросов — в app['site'].
+    """
+    app = web.Application()
+    site = app['site'] = SiteState(pages, per_page, latency, error_rate, seed)
+
+    async def respond(request, kind, text):
+        site.requests[kind] += 1
+        if site.latency:
+            await asyncio.sleep(site.latency * site.random.uniform(0.5, 1.5))
+        if site.error_rate and site.random.random() < site.error_rate:
+            site.requests['errors'] += 1
+            return web.Response(status=503, text='Service Unavailable')
+        etag = '"{}"'.format(hashlib.md5(text.encode('utf-8')).hexdigest())
+        if request.headers.get('If-None-Match') == etag:
+            site.requests['not_modified'] += 1
+            return web.Response(status=304, headers={'ETag': etag})
+        return web.Response(text=text, content_type='text/html', headers={'ETag': etag})
+
+    async def listing(request):
+        page = int(request.match_info['page'])
+        base_url = f'{request.scheme}://{request.host}'
+        cards = site.per_page if page <= site.pages else 0
+        html = render_listing(cards, page, site.pages, base_url, first_index=(page - 1) * site.per_page,
+                              versions=site.versions)
+        return await respond(request, 'listing', html)
+
+    async def detail(request):
+        return await respond(request, 'detail', render_detail(request.match_info['slug']))
+
+    app.router.add_get(LISTING_PATH.format('{page}'), listing)
+    app.router.add_get('/pets/{slug}/', detail)
+    return app
+
+
+async def start_server(app, host='127.0.0.1', port=0):
+    """Запустить сервер; возвращает runner и базовый адрес"""
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    site = web.TCPSite(runner, host, port)
+    await site.start()
+    port = site._server.sockets[0].getsockname()[1]
+    return runner, f'http://{host}:{port}'
@@ -0,0 +1,87 @@
+"""Микробенчмарк клавиатур бота: процессорное время на одно нажатие без кэша и с кэшем клавиатур.
+
+Нажатие — построение клавиатуры, которую вернёт обработчик, и её сериализация в запрос к Telegram.
+
+Запуск из каталога project/bot:
+    python benchmarks/keyboards.py --clicks 20000
+"""
+import argparse
+import json
+import logging
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# main создаёт бота при импорте; запросов к Telegram бенчмарк не делает
+os.environ.setdefault('TOKEN', '123456:benchmark')
+
+import main as bot_main  # noqa: E402
+
+AGE_COUNTS = (12, 30, 41, 38, 25, 19, 14, 9, 6, 4, 2, 1, 1)
+SEX_COUNTS = (96, 105)
+
+
+def clicks(build):
+    """Нажатия, как в обработчиках: build(имя клавиатуры, *аргументы) → разметка"""
+    selected = {"sex": "Мужской", "age_min": 1, "age_max": 4}
+    return {
+        'main_menu': lambda: build('main_keyboard'),
+        'filters': lambda: build('filters_keyboard', selected),
+        'broadcast_filters': lambda: build('broadcast_filters_keyboard', {}),
+        'sex': lambda: build('sex_keyboard', "broadcast_", SEX_COUNTS),
+        'age_min': lambda: build('age_keyboard', 0, 12, "min", "", AGE_COUNTS),
+        'broadcast_menu': lambda: build('broadcast_management_keyboard'),
+    }
+
+
+def uncached(name, *args):
+    """Построение клавиатуры в обход кэша, как до мемоизации"""
+    if name == 'filters_keyboard':
+        return bot_main._filters_keyboard.__wrapped__(*bot_main.selected_flags(*args))
+    if name == 'broadcast_filters_keyboard':
+        return bot_main._broadcast_filters_keyboard.__wrapped__(*bot_main.selected_flags(*args))
+    return getattr(bot_main, name).__wrapped__(*args)
+
+
+def cached(name, *args):
+    return getattr(bot_main, name)(*args)
+
+
+def measure(click, count, session):
+    """Процессорное время на нажатие, мкс"""
+    start = time.process_time()
+    for _ in range(count):
+        session.prepare_value(click(), bot=bot_main.bot, files={})
+    return (time.process_time() - start) / count * 1e6
+
+
+def main():
+    args = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    args.add_argument('--clicks', type=int, default=20000, help='Нажатий на каждую клавиатуру')
+    args.add_argument('--output', help='Файл для JSON (по умолчанию stdout)')
+    args = args.parse_args()
+
+    logging.disable(logging.WARNING)
+    session = bot_main.bot.session
+    results = {}
+    for (name, before), after in zip(clicks(uncached).items(), clicks(cached).values()):
+        before_us = measure(before, args.clicks, session)
+        after_us = measure(after, args.clicks, session)
+        results[name] = {
+            'before_us': round(before_us, 2),
+            'after_us': round(after_us, 2),
+            'speedup': round(before_us / after_us, 2),
+        }
+
+    output = json.dumps(results, ensure_ascii=False, indent=2)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(output)
+    else:
+        print(output)
+
+
+if __name__ == '__main__':
+    main()
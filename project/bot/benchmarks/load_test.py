@@ -0,0 +1,138 @@
+"""Нагрузочный прогон парсера против локальной копии сайта приюта.
+
+Сервер-заглушка отдаёт страницы в разметке сайта с заданными задержкой, долей ошибок 503
+и изменением карточек между обходами. parser.main запускается несколько раз подряд на одной базе.
+
+Запуск из каталога project/bot:
+    python benchmarks/load_test.py --pages 50 --latency 0.2 --error-rate 0.02 --churn 0.05 --runs 3
+    python benchmarks/load_test.py --mode incremental --runs 5 --output load.json
+
+Для каждого обхода выводится время, число запросов по видам и время записи в базу.
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+from collections import Counter
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import parser as crawler  # noqa: E402
+import fixture_site  # noqa: E402
+
+
+async def run_crawl(site, incremental, args):
+    """Один обход parser.main; возвращает замеры"""
+    before = Counter(site.requests)
+    writes = []
+    save_to_db = crawler.save_to_db
+
+    async def timed_save(animals, conn):
+        start = time.perf_counter()
+        try:
+            return await save_to_db(animals, conn)
+        finally:
+            writes.append(time.perf_counter() - start)
+
+    crawler.save_to_db = timed_save
+    try:
+        start = time.perf_counter()
+        await crawler.main(concurrency=args.concurrency, rate_limit=args.rate_limit, incremental=incremental)
+        elapsed = time.perf_counter() - start
+    finally:
+        crawler.save_to_db = save_to_db
+
+    requests = site.requests - before
+    conn = sqlite3.connect(crawler.DB_PATH)
+    try:
+        rows = conn.execute("SELECT COUNT(*) FROM animals").fetchone()[0]
+    finally:
+        conn.close()
+    return {
+        'mode': 'incremental' if incremental else 'full',
+        'seconds': round(elapsed, 3),
+        'requests': {
+            'total': requests['listing'] + requests['detail'],
+            'listing': requests['listing'],
+            'detail': requests['detail'],
+            'not_modified': requests['not_modified'],
+            'errors': requests['errors'],
+        },
+        'db_write': {
+            'batches': len(writes),
+            'seconds': round(sum(writes), 4),
+            'max_batch_seconds': round(max(writes), 4) if writes else None,
+        },
+        'rows': rows,
+    }
+
+
+async def load_test(args):
+    app = fixture_site.make_app(args.pages, args.per_page, args.latency, args.error_rate, args.seed)
+    site = app['site']
+    runner, base_url = await fixture_site.start_server(app)
+    runs = []
+    try:
+        with tempfile.TemporaryDirectory() as tmp:
+            crawler.DB_PATH = os.path.join(tmp, 'pets.db')
+            crawler.BASE_URL = base_url + fixture_site.LISTING_PATH
+            for number in range(args.runs):
+                changed = site.churn(args.churn) if number and args.churn else 0
+                # Первый обход всегда полный: база пустая
+                incremental = number > 0 and args.mode == 'incremental'
+                result = await run_crawl(site, incremental, args)
+                result['changed_cards'] = changed
+                runs.append(result)
+                logging.warning("Обход %s: %.2f с, запросов %s, запись в базу %.3f с", number + 1,
+                                result['seconds'], result['requests']['total'], result['db_write']['seconds'])
+    finally:
+        await runner.cleanup()
+    return {
+        'site': {
+            'pages': args.pages,
+            'cards_per_page': args.per_page,
+            'latency': args.latency,
+            'error_rate': args.error_rate,
+            'churn': args.churn,
+        },
+        'crawler': {'concurrency': args.concurrency, 'rate_limit': args.rate_limit},
+        'runs': runs,
+    }
+
+
+def main():
+    args = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    args.add_argument('--pages', type=int, default=16, help='Страниц списка')
+    args.add_argument('--per-page', type=int, default=12, help='Карточек на странице')
+    args.add_argument('--latency', type=float, default=0.05, help='Средняя задержка ответа, секунд')
+    args.add_argument('--error-rate', type=float, default=0.0, help='Доля ответов 503')
+    args.add_argument('--churn', type=float, default=0.05, help='Доля карточек, меняющихся между обходами')
+    args.add_argument('--runs', type=int, default=3, help='Число обходов подряд')
+    args.add_argument('--mode', choices=('full', 'incremental'), default='full',
+                      help='Режим повторных обходов')
+    args.add_argument('--concurrency', type=int, default=crawler.CONCURRENCY)
+    args.add_argument('--rate-limit', type=float, default=50.0, help='Запросов в секунду к хосту')
+    args.add_argument('--seed', type=int, default=0)
+    args.add_argument('--output', help='Файл для JSON (по умолчанию stdout)')
+    args = args.parse_args()
+
+    # Логи парсера на каждую страницу не нужны, предупреждения и ошибки остаются
+    logging.disable(logging.INFO)
+    results = asyncio.run(load_test(args))
+
+    output = json.dumps(results, ensure_ascii=False, indent=2)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(output)
+    else:
+        print(output)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,233 @@
+"""Офлайн-бенчмарки парсера: разбор страниц, запись в базу и полный обход против локального сервера.
+
+Запуск из каталога project/bot:
+    python benchmarks/run_benchmarks.py --output bench.json
+    python benchmarks/run_benchmarks.py --quick
+
+Результат — JSON, который можно сравнивать между запусками.
+"""
+import argparse
+import asyncio
+import gc
+import json
+import logging
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import parser as crawler  # noqa: E402
+import fixture_site  # noqa: E402
+import normalize  # noqa: E402
+
+# Значения возраста и пола в том виде, в каком они встречаются на сайте
+RAW_AGES = ('2 года', '5 лет', '3 месяца', '1 год 3 месяца', '8 мес.', '10 лет', '1,5 года', '1.5 года',
+            '2-3 года', 'Не указан', '')
+RAW_SEXES = ('Мальчик', 'Девочка', 'Не указан', 'самка', 'муж.', 'жен.', 'кобель')
+
+
+def timed(fn, repeat):
+    """Лучшее время из repeat запусков и результат последнего"""
+    best = None
+    result = None
+    for _ in range(repeat):
+        gc.collect()
+        start = time.perf_counter()
+        result = fn()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+def bench_parse(card_counts, repeat):
+    """Скорость разбора и память на карточку: записанная страница и синтетические страницы"""
+    pages = {'recorded': fixture_site.load_fixture('listing_page.html')}
+    for cards in card_counts:
+        pages[f'synthetic_{cards}'] = fixture_site.render_listing(cards)
+
+    results = {}
+    for name, html in pages.items():
+        elapsed, animals = timed(lambda: crawler.parse_cards(html, 1), repeat)
+        cards = len(animals)
+
+        gc.collect()
+        tracemalloc.start()
+        animals = crawler.parse_cards(html, 1)
+        retained, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+        results[name] = {
+            'cards': cards,
+            'html_bytes': len(html.encode('utf-8')),
+            'seconds': round(elapsed, 6),
+            'cards_per_second': round(cards / elapsed, 1) if elapsed else None,
+            'peak_bytes_per_card': round(peak / cards) if cards else None,
+            'retained_bytes_per_card': round(retained / cards) if cards else None,
+        }
+    return results
+
+
+def make_animals(count, version=0):
+    return [{
+        'name': f'Животное {i}',
+        'age': f'{i % 15} лет',
+        'sex': 'Мальчик' if i % 2 else 'Девочка',
+        'description': f'https://less-homeless.com/pets/pet-{i}/',
+        'photo_url': f'https://less-homeless.com/wp-content/uploads/pet-{i}-{version}.jpg',
+    } for i in range(count)]
+
+
+def bench_save(row_counts):
+    """Строк в секунду у save_to_db: первичная вставка, повтор без изменений и обновление всех строк"""
+    results = {}
+    for rows in row_counts:
+        with tempfile.TemporaryDirectory() as tmp:
+            crawler.DB_PATH = os.path.join(tmp, 'pets.db')
+            conn = crawler.init_db()
+            runs = {}
+            for label, animals in (('insert', make_animals(rows)),
+                                   ('unchanged', make_animals(rows)),
+                                   ('update', make_animals(rows, version=1))):
+                start = time.perf_counter()
+                stats = asyncio.run(crawler.save_to_db(animals, conn))
+                elapsed = time.perf_counter() - start
+                runs[label] = {
+                    'seconds': round(elapsed, 6),
+                    'rows_per_second': round(rows / elapsed, 1),
+                    'stats': stats,
+                }
+            conn.close()
+        results[str(rows)] = runs
+    return results
+
+
+def bench_normalize(value_counts, repeat):
+    """Нормализация возраста и пола: по одному значению без кэша и пакетом normalized_batch с пустым кэшем"""
+    age_months = normalize.age_months.__wrapped__
+    normalize_sex = normalize.normalize_sex.__wrapped__
+
+    def per_value(animals):
+        # Как до мемоизации: каждое значение разбирается заново
+        return [(age_months(animal['age']), normalize_sex(animal['sex'])) for animal in animals]
+
+    def batch(animals):
+        normalize.age_months.cache_clear()
+        normalize.normalize_sex.cache_clear()
+        return normalize.normalized_batch(animals)
+
+    results = {}
+    for count in value_counts:
+        animals = [{'age': f'{i % 15} лет' if i % 3 else RAW_AGES[i % len(RAW_AGES)],
+                    'sex': RAW_SEXES[i % len(RAW_SEXES)]} for i in range(count)]
+        runs = {}
+        for label, fn in (('per_value', per_value), ('batch', batch)):
+            elapsed, _ = timed(lambda: fn(animals), repeat)
+            runs[label] = {
+                'seconds': round(elapsed, 6),
+                'values_per_second': round(count / elapsed, 1),
+            }
+        results[str(count)] = runs
+    return results
+
+
+def percentile(values, share):
+    if not values:
+        return None
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * share))]
+
+
+async def bench_crawl(pages, per_page, rate_limit, concurrency):
+    """Полный обход parser.main против локального сервера-заглушки с задержками отдельных запросов"""
+    app = fixture_site.make_app(pages, per_page)
+    runner, base_url = await fixture_site.start_server(app)
+    latencies = []
+    fetch_page = crawler.fetch_page
+
+    async def timed_fetch(session, url, limiter=None, cache=None, breaker=None):
+        # Время от отправки до получения тела, без ожидания ограничителя частоты
+        if limiter:
+            await limiter.acquire(url)
+        start = time.perf_counter()
+        try:
+            return await fetch_page(session, url, None, cache, breaker)
+        finally:
+            latencies.append(time.perf_counter() - start)
+
+    crawler.fetch_page = timed_fetch
+    try:
+        with tempfile.TemporaryDirectory() as tmp:
+            crawler.DB_PATH = os.path.join(tmp, 'pets.db')
+            crawler.BASE_URL = base_url + fixture_site.LISTING_PATH
+            start = time.perf_counter()
+            await crawler.main(concurrency=concurrency, rate_limit=rate_limit, incremental=False)
+            elapsed = time.perf_counter() - start
+    finally:
+        crawler.fetch_page = fetch_page
+        await runner.cleanup()
+    return {
+        'pages': pages,
+        'cards_per_page': per_page,
+        'rate_limit': rate_limit,
+        'concurrency': concurrency,
+        'requests': app['site'].total_requests,
+        'seconds': round(elapsed, 3),
+        'request_ms': {
+            'mean': round(sum(latencies) / len(latencies) * 1000, 3) if latencies else None,
+            'p50': round(percentile(latencies, 0.5) * 1000, 3) if latencies else None,
+            'p95': round(percentile(latencies, 0.95) * 1000, 3) if latencies else None,
+            'max': round(max(latencies) * 1000, 3) if latencies else None,
+        },
+    }
+
+
+def git_revision():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except OSError:
+        return None
+
+
+def main():
+    args = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    args.add_argument('--output', help='Файл для JSON (по умолчанию stdout)')
+    args.add_argument('--quick', action='store_true', help='Короткий прогон без 100k строк')
+    args.add_argument('--repeat', type=int, default=5, help='Повторов для замеров разбора')
+    args = args.parse_args()
+
+    # Логи парсера на каждую страницу исказили бы замеры
+    logging.disable(logging.WARNING)
+    row_counts = (1000, 10000) if args.quick else (1000, 10000, 100000)
+    card_counts = (100, 1000) if args.quick else (100, 1000, 5000)
+
+    results = {
+        'meta': {
+            'timestamp': datetime.now().isoformat(timespec='seconds'),
+            'git_revision': git_revision(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+        },
+        'parse': bench_parse(card_counts, args.repeat),
+        'save_to_db': bench_save(row_counts),
+        'normalize': bench_normalize(row_counts, args.repeat),
+        'crawl': asyncio.run(bench_crawl(pages=16, per_page=12, rate_limit=50, concurrency=crawler.CONCURRENCY)),
+    }
+
+    output = json.dumps(results, ensure_ascii=False, indent=2)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(output)
+    else:
+        print(output)
+
+
+if __name__ == '__main__':
+    main()
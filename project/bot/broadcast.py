@@ -0,0 +1,97 @@
+import asyncio
+import logging
+import time
+
+from aiogram.exceptions import TelegramRetryAfter
+
+from rate_limit import TokenBucket
+
+BROADCAST_RATE = 25        # Сообщений в секунду на всего бота (Telegram допускает около 30)
+BROADCAST_BURST = 5        # Допустимый всплеск сверх ровного темпа
+CHAT_RATE = 20 / 60        # Сообщений в секунду в один чат (в группы — не больше 20 в минуту)
+BROADCAST_WORKERS = 64     # Сколько отправок может выполняться одновременно
+BROADCAST_ATTEMPTS = 5     # Сколько раз отправка откладывается по TelegramRetryAfter, прежде чем её бросить
+
+
+def percentile(values, share):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * share))] if values else None
+
+
+class BroadcastDispatcher:
+    """Отправка сообщений рассылки в пределах лимитов Telegram.
+
+    Все отправки проходят через общее ведро токенов бота и ведро своего чата, поэтому волна рассылки
+    и срабатывающие независимо задачи планировщика вместе не превышают лимиты. Отправка,
+    на которую Telegram ответил TelegramRetryAfter, повторяется после указанной паузы.
+    """
+
+    def __init__(self, rate=BROADCAST_RATE, burst=BROADCAST_BURST, chat_rate=CHAT_RATE,
+                 workers=BROADCAST_WORKERS, attempts=BROADCAST_ATTEMPTS):
+        self.rate = rate
+        self.chat_rate = chat_rate
+        self.attempts = attempts
+        self.limiter = TokenBucket(rate, burst)
+        self._chats = {}
+        self._slots = asyncio.Semaphore(workers)
+
+    def chat_bucket(self, chat_id):
+        if chat_id not in self._chats:
+            self._chats[chat_id] = TokenBucket(self.chat_rate)
+        return self._chats[chat_id]
+
+    async def send(self, chat_id, deliver, stats=None):
+        """Выполнить deliver() для чата chat_id в пределах лимитов; результат deliver() или None при ошибке"""
+        for attempt in range(1, self.attempts + 1):
+            await self.chat_bucket(chat_id).acquire()
+            # Слот занимается только на время отправки: ожидание RetryAfter не держит других
+            async with self._slots:
+                await self.limiter.acquire()
+                if stats is not None:
+                    stats['started'].append(time.monotonic())
+                try:
+                    return await deliver()
+                except TelegramRetryAfter as e:
+                    retry_after = e.retry_after
+                except Exception as e:
+                    logging.error(f"Ошибка при отправке рассылки в чат {chat_id}: {e}")
+                    return None
+            if stats is not None:
+                stats['retried'] += 1
+            logging.warning("Telegram просит подождать %s с перед отправкой в чат %s (попытка %s из %s)",
+                            retry_after, chat_id, attempt, self.attempts)
+            await asyncio.sleep(retry_after)
+        logging.error(f"Рассылка в чат {chat_id} отменена: превышено число повторов")
+        return None
+
+    async def wave(self, jobs):
+        """Разослать jobs — пары (chat_id, deliver) — параллельно и вернуть отчёт о волне.
+
+        lag — насколько позже отправка началась по сравнению с самым ранним моментом, который допускает
+        общий лимит rate при такой же очерёдности.
+        """
+        jobs = list(jobs)
+        stats = {'started': [], 'retried': 0}
+        start = time.monotonic()
+        results = await asyncio.gather(*(self.send(chat_id, deliver, stats) for chat_id, deliver in jobs))
+        elapsed = time.monotonic() - start
+
+        # Первые burst отправок лимит пропускает сразу, остальные — по одной на 1/rate секунды
+        burst = self.limiter.capacity
+        lags = [max(0.0, started - start - max(0, i - burst + 1) / self.rate)
+                for i, started in enumerate(sorted(stats['started']))]
+        sent = sum(1 for result in results if result)
+        report = {
+            'channels': len(jobs),
+            'sent': sent,
+            'failed': len(jobs) - sent,
+            'retried': stats['retried'],
+            'seconds': round(elapsed, 3),
+            'expected_seconds': round(max(0, len(jobs) - burst) / self.rate, 3),
+            'per_second': round(sent / elapsed, 1) if elapsed else None,
+            'lag_p50': round(percentile(lags, 0.5), 3) if lags else None,
+            'lag_p95': round(percentile(lags, 0.95), 3) if lags else None,
+            'lag_max': round(max(lags), 3) if lags else None,
+        }
+        logging.info("Волна рассылки: %s", report)
+        return report
@@ -0,0 +1,294 @@
+import asyncio
+import heapq
+import json
+import logging
+import re
+import sqlite3
+import time
+from collections import OrderedDict
+from types import MappingProxyType
+
+CARD_CACHE_SIZE = 256      # Сколько готовых карточек держать в памяти
+CATALOG_RECHECK = 60       # Раз в сколько секунд сверять catalog_version (если парсер в другом процессе)
+SEARCH_LIMIT = 50          # Максимум результатов поиска по имени
+FILTER_CACHE_SIZE = 128    # Сколько наборов фильтров помнить
+FILTER_CACHE_TTL = 600     # Сколько секунд держать результат отбора
+
+SEARCH_WORD_RE = re.compile(r'\w+')
+
+# Обработчики изменения каталога в этом процессе (кэши бота)
+_listeners = []
+
+
+def on_catalog_change(callback):
+    """Подписать callback() на изменения каталога, зафиксированные парсером в этом процессе"""
+    _listeners.append(callback)
+
+
+def notify_catalog_changed():
+    for callback in _listeners:
+        callback()
+
+
+def read_catalog_version(conn):
+    """Версия каталога, которую парсер увеличивает при каждом изменении animals (0, если парсер ещё не работал)"""
+    try:
+        row = conn.execute("SELECT value FROM crawl_state WHERE key = 'catalog_version'").fetchone()
+    except sqlite3.OperationalError:
+        return 0
+    return int(row[0]) if row else 0
+
+
+def fts_query(text, column=None):
+    """Запрос к animals_fts: каждое слово пользователя ищется как начало слова, все слова обязательны.
+
+    Если задан column, слова ищутся только в этой колонке.
+    """
+    words = SEARCH_WORD_RE.findall(text.replace('ё', 'е').replace('Ё', 'Е'))
+    query = ' '.join(f'"{word}"*' for word in words)
+    return f'{{{column}}} : ({query})' if column and query else query
+
+
+async def search_animal_ids(db, text, limit=SEARCH_LIMIT, column=None):
+    """Id животных, подходящих под запрос, от лучших к худшим (имя весит больше описания)"""
+    query = fts_query(text, column)
+    if not query:
+        return []
+    try:
+        rows = await db.fetchall('''SELECT rowid FROM animals_fts WHERE animals_fts MATCH ?
+                                    ORDER BY bm25(animals_fts, 10.0, 1.0, 2.0) LIMIT ?''', (query, limit))
+    except sqlite3.Error as e:
+        logging.error(f"Ошибка полнотекстового поиска: {e}")
+        return []
+    return [row[0] for row in rows]
+
+
+def filter_signature(filters):
+    """Каноничная запись фильтров: одинаковые наборы дают одну подпись при любом порядке ключей"""
+    return json.dumps(filters, sort_keys=True, ensure_ascii=False)
+
+
+class CatalogStats:
+    """Сводка каталога: число животных по паре (пол, возраст в годах) из таблицы animal_stats"""
+
+    def __init__(self, version=0, rows=()):
+        self.version = version
+        self.counts = {(sex, age): animals for sex, age, animals in rows}
+        ages = [age for _, age in self.counts if age is not None]
+        self.min_age = min(ages) if ages else None
+        self.max_age = max(ages) if ages else None
+
+    def by_sex(self, age_min=None, age_max=None):
+        """Число животных по полу (только в возрастах от age_min до age_max, если они заданы)"""
+        result = {}
+        for (sex, age), animals in self.counts.items():
+            if age_min is not None and age_max is not None and (age is None or not age_min <= age <= age_max):
+                continue
+            result[sex] = result.get(sex, 0) + animals
+        return result
+
+    def by_age(self, sex=None):
+        """Число животных по возрасту (только указанного пола, если он задан)"""
+        result = {}
+        for (animal_sex, age), animals in self.counts.items():
+            if age is not None and (sex is None or animal_sex == sex):
+                result[age] = result.get(age, 0) + animals
+        return result
+
+    def age_option_counts(self, start_age, end_age, mode, sex=None, age_min=None):
+        """Сколько животных даст каждая кнопка возраста от start_age до end_age.
+
+        Для mode="min" — животные не младше кнопки, для mode="max" — от age_min до кнопки.
+        """
+        by_age = self.by_age(sex)
+        counts = []
+        for option in range(start_age, end_age + 1):
+            if mode == "min":
+                counts.append(sum(n for age, n in by_age.items() if age >= option))
+            else:
+                low = age_min if age_min is not None else start_age
+                counts.append(sum(n for age, n in by_age.items() if low <= age <= option))
+        return tuple(counts)
+
+
+class CatalogSnapshot:
+    """Неизменяемый снимок таблицы animals с индексами по id, полу и возрасту.
+
+    Записи — словари только для чтения (MappingProxyType), упорядоченные по id.
+    """
+
+    def __init__(self, version=0, animals=(), stats_rows=()):
+        self.version = version
+        self.animals = tuple(MappingProxyType(dict(animal)) for animal in animals)
+        self.by_id = {animal["id"]: animal for animal in self.animals}
+        by_sex, by_age = {}, {}
+        for animal in self.animals:
+            by_sex.setdefault(animal["sex_norm"], []).append(animal)
+            by_age.setdefault(animal["age_years"], []).append(animal)
+        self.by_sex = {sex: tuple(animals) for sex, animals in by_sex.items()}
+        self.by_age = {age: tuple(animals) for age, animals in by_age.items()}
+        self._names = {animal["id"]: (animal["name"] or "").casefold() for animal in self.animals}
+        self.stats = CatalogStats(version, stats_rows)
+
+    def get(self, animal_id):
+        return self.by_id.get(animal_id)
+
+    def matches(self, animal, filters):
+        if "name" in filters and filters["name"].casefold() not in self._names[animal["id"]]:
+            return False
+        if "sex" in filters and animal["sex_norm"] != filters["sex"]:
+            return False
+        if "age_min" in filters and "age_max" in filters:
+            age = animal["age_years"]
+            if age is None or not filters["age_min"] <= age <= filters["age_max"]:
+                return False
+        return True
+
+    def filter(self, filters):
+        """Животные, подходящие под фильтры бота (name, sex, age_min/age_max), по возрастанию id"""
+        # Перебираются записи самого узкого из подходящих индексов, остальные условия проверяются на них
+        candidates = [self.animals]
+        if "sex" in filters:
+            candidates.append(self.by_sex.get(filters["sex"], ()))
+        if "age_min" in filters and "age_max" in filters:
+            ages = [self.by_age[age] for age in self.by_age
+                    if age is not None and filters["age_min"] <= age <= filters["age_max"]]
+            candidates.append(tuple(heapq.merge(*ages, key=lambda animal: animal["id"])))
+        base = min(candidates, key=len)
+        return tuple(animal for animal in base if self.matches(animal, filters))
+
+
+class CatalogStore:
+    """Снимок каталога в памяти, который подменяется целиком после записи парсера.
+
+    Изменение замечается сразу по уведомлению парсера в этом процессе и не позже чем через recheck секунд
+    по catalog_version. В остальное время чтение не обращается к базе.
+    """
+
+    def __init__(self, db, columns, recheck=CATALOG_RECHECK):
+        self.db = db
+        self.columns = columns
+        self.recheck = recheck
+        self._snapshot = None
+        self._stale = True
+        self._checked_at = 0.0
+        self._lock = asyncio.Lock()
+        on_catalog_change(self.invalidate)
+
+    def invalidate(self):
+        self._stale = True
+
+    def _fresh(self):
+        return (self._snapshot is not None and not self._stale
+                and time.monotonic() - self._checked_at < self.recheck)
+
+    def _load(self, conn):
+        # Версия, животные и сводка читаются в одной транзакции, чтобы снимок был согласованным
+        conn.execute("BEGIN")
+        try:
+            version = read_catalog_version(conn)
+            if self._snapshot is not None and self._snapshot.version == version:
+                return self._snapshot
+            rows = conn.execute(f"SELECT {', '.join(self.columns)} FROM animals ORDER BY id").fetchall()
+            stats_rows = conn.execute("SELECT sex_norm, age_years, animals FROM animal_stats").fetchall()
+        finally:
+            conn.commit()
+        return CatalogSnapshot(version, (dict(zip(self.columns, row)) for row in rows), stats_rows)
+
+    async def get(self):
+        """Текущий снимок каталога"""
+        if self._fresh():
+            return self._snapshot
+        async with self._lock:
+            if self._fresh():
+                return self._snapshot
+            # Флаг сбрасывается до загрузки: уведомление во время неё вызовет ещё одну проверку
+            self._stale = False
+            self._checked_at = time.monotonic()
+            try:
+                snapshot = await self.db.run(self._load)
+            except sqlite3.Error as e:
+                logging.error(f"Ошибка при загрузке каталога: {e}")
+                return self._snapshot or CatalogSnapshot()
+            if snapshot is not self._snapshot:
+                logging.info("Каталог загружен в память: версия %s, животных: %s",
+                             snapshot.version, len(snapshot.animals))
+                self._snapshot = snapshot
+            return snapshot
+
+
+class CardCache:
+    """LRU-кэш готовых карточек животных по (id, row_version).
+
+    Изменённое парсером животное получает новый row_version, поэтому его старая карточка
+    просто перестаёт запрашиваться и вытесняется.
+    """
+
+    def __init__(self, render, maxsize=CARD_CACHE_SIZE):
+        self.render = render
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._cards = OrderedDict()
+
+    def get(self, animal):
+        """Карточка для записи животного из снимка каталога"""
+        key = (animal["id"], animal["row_version"])
+        card = self._cards.get(key)
+        if card is not None:
+            self._cards.move_to_end(key)
+            self.hits += 1
+            return card
+        self.misses += 1
+        card = self._cards[key] = self.render(animal)
+        if len(self._cards) > self.maxsize:
+            self._cards.popitem(last=False)
+        return card
+
+
+class FilterCache:
+    """LRU-кэш результатов отбора: подпись фильтров → кортеж id животных.
+
+    Результаты действительны только для одной версии каталога: при смене версии кэш очищается целиком.
+    """
+
+    def __init__(self, maxsize=FILTER_CACHE_SIZE, ttl=FILTER_CACHE_TTL):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.version = None
+        self._ids = OrderedDict()
+
+    @property
+    def hit_rate(self):
+        requests = self.hits + self.misses
+        return self.hits / requests if requests else 0.0
+
+    def _check_version(self, version):
+        if version != self.version:
+            if self._ids:
+                logging.info("Кэш фильтров сброшен (версия каталога %s): попаданий %s, промахов %s, доля %.0f%%",
+                             version, self.hits, self.misses, self.hit_rate * 100)
+            self._ids.clear()
+            self.version = version
+
+    def get(self, version, filters):
+        """Id животных для фильтров или None, если результата нет или он устарел"""
+        self._check_version(version)
+        key = filter_signature(filters)
+        entry = self._ids.get(key)
+        if entry is not None and time.monotonic() - entry[0] < self.ttl:
+            self._ids.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+        self.misses += 1
+        return None
+
+    def put(self, version, filters, ids):
+        self._check_version(version)
+        key = filter_signature(filters)
+        self._ids[key] = (time.monotonic(), tuple(ids))
+        self._ids.move_to_end(key)
+        if len(self._ids) > self.maxsize:
+            self._ids.popitem(last=False)
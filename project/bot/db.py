@@ -0,0 +1,76 @@
+import asyncio
+import logging
+import sqlite3
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+DB_THREADS = 2          # Потоков для запросов: чтение не ждёт записи
+BUSY_TIMEOUT_MS = 5000  # Сколько ждать снятия блокировки записи, прежде чем вернуть ошибку
+
+
+def configure(conn):
+    """Включить WAL и ожидание блокировки для соединения.
+
+    В режиме WAL читатели не блокируются записью парсера, а писатели ждут друг друга до busy_timeout.
+    """
+    conn.execute(f"PRAGMA busy_timeout = {BUSY_TIMEOUT_MS}")
+    conn.execute("PRAGMA journal_mode = WAL")
+    conn.execute("PRAGMA synchronous = NORMAL")
+    return conn
+
+
+class Database:
+    """Постоянные соединения с базой в отдельных потоках: запросы не блокируют цикл событий.
+
+    У каждого потока своё соединение, оно открывается при первом запросе и живёт до close().
+    """
+
+    def __init__(self, path, threads=DB_THREADS):
+        self.path = path
+        self._executor = ThreadPoolExecutor(max_workers=threads, thread_name_prefix='db')
+        self._local = threading.local()
+        self._connections = []
+        self._lock = threading.Lock()
+
+    def _connection(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = configure(sqlite3.connect(self.path, check_same_thread=False))
+            self._local.conn = conn
+            with self._lock:
+                self._connections.append(conn)
+            logging.debug("Открыто соединение с базой в потоке %s", threading.current_thread().name)
+        return conn
+
+    def _call(self, fn, args):
+        conn = self._connection()
+        try:
+            return fn(conn, *args)
+        except BaseException:
+            conn.rollback()
+            raise
+
+    async def run(self, fn, *args):
+        """Выполнить fn(conn, *args) в потоке базы"""
+        return await asyncio.get_running_loop().run_in_executor(self._executor, self._call, fn, args)
+
+    async def fetchall(self, query, params=()):
+        return await self.run(lambda conn: conn.execute(query, params).fetchall())
+
+    async def fetchone(self, query, params=()):
+        return await self.run(lambda conn: conn.execute(query, params).fetchone())
+
+    async def execute(self, query, params=()):
+        """Выполнить изменяющий запрос и зафиксировать его; возвращает число затронутых строк"""
+        def execute(conn):
+            with conn:
+                return conn.execute(query, params).rowcount
+        return await self.run(execute)
+
+    def close(self):
+        """Дождаться запросов в работе и закрыть соединения"""
+        self._executor.shutdown(wait=True)
+        with self._lock:
+            for conn in self._connections:
+                conn.close()
+            self._connections.clear()
@@ -0,0 +1,180 @@
+import aiohttp
+import asyncio
+import logging
+import random
+import time
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from urllib.parse import urlsplit
+
+from fake_headers import Headers
+
+try:
+    from aiohttp.compression_utils import HAS_BROTLI
+except ImportError:
+    HAS_BROTLI = False
+
+# Настройки соединений
+CONNECTION_LIMIT = 20      # Всего соединений в пуле
+LIMIT_PER_HOST = 4         # Соединений к одному хосту
+DNS_CACHE_TTL = 300        # Секунд хранить результат DNS-запроса
+KEEPALIVE_TIMEOUT = 30     # Секунд держать простаивающее соединение открытым
+
+# Таймауты запроса, секунд
+TIMEOUT_TOTAL = 60
+TIMEOUT_CONNECT = 10
+TIMEOUT_SOCK_READ = 30
+
+HEADER_PROFILES = 16       # Сколько наборов заголовков сгенерировать заранее
+# br запрашиваем, только если aiohttp умеет его распаковать
+ACCEPT_ENCODING = 'gzip, deflate, br' if HAS_BROTLI else 'gzip, deflate'
+
+# Настройки повторных попыток
+MAX_RETRIES = 3          # Повторов после первой неудачной попытки
+BACKOFF_BASE = 1.0       # Базовая задержка, секунд
+BACKOFF_MAX = 30.0       # Максимальная задержка между попытками
+RETRY_AFTER_MAX = 120.0  # Больше этого Retry-After не ждём
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+# Настройки предохранителя
+BREAKER_THRESHOLD = 5    # Неудач подряд, после которых хост считается недоступным
+BREAKER_COOLDOWN = 60.0  # Через сколько секунд пробовать снова
+
+
+_header_profiles = []
+
+
+def header_profile():
+    """Копия случайного набора заголовков из заранее сгенерированного пула"""
+    if not _header_profiles:
+        for _ in range(HEADER_PROFILES):
+            headers = Headers(browser='chrome', os='win').generate()
+            headers.update({
+                'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8',
+                'Accept-Language': 'ru-RU,ru;q=0.9,en;q=0.8',
+                'Accept-Encoding': ACCEPT_ENCODING,
+            })
+            _header_profiles.append(headers)
+    return dict(random.choice(_header_profiles))
+
+
+def create_session(limit_per_host=LIMIT_PER_HOST):
+    """Сессия парсера: пул keep-alive соединений, кэш DNS, сжатие и таймауты"""
+    connector = aiohttp.TCPConnector(
+        limit=max(CONNECTION_LIMIT, limit_per_host),
+        limit_per_host=limit_per_host,
+        ttl_dns_cache=DNS_CACHE_TTL,
+        keepalive_timeout=KEEPALIVE_TIMEOUT,
+    )
+    timeout = aiohttp.ClientTimeout(total=TIMEOUT_TOTAL, connect=TIMEOUT_CONNECT, sock_read=TIMEOUT_SOCK_READ)
+    return aiohttp.ClientSession(connector=connector, timeout=timeout, auto_decompress=True)
+
+
+class FetchError(Exception):
+    """Страницу не удалось загрузить (в отличие от страницы, на которой просто нет животных)"""
+
+    def __init__(self, url, reason, status=None):
+        super().__init__(f"{reason} при запросе {url}")
+        self.url = url
+        self.status = status
+
+
+class CircuitOpenError(FetchError):
+    """Запрос не отправлен: хост временно отключён предохранителем"""
+
+
+class RetryableStatus(Exception):
+    """Ответ с кодом, после которого стоит повторить запрос"""
+
+    def __init__(self, status, retry_after=None):
+        super().__init__(f"HTTP {status}")
+        self.status = status
+        self.retry_after = retry_after
+
+
+def parse_retry_after(value):
+    """Значение заголовка Retry-After в секундах (число или HTTP-дата)"""
+    if not value:
+        return None
+    value = value.strip()
+    if value.isdigit():
+        return float(value)
+    try:
+        when = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if when.tzinfo is None:
+        when = when.replace(tzinfo=timezone.utc)
+    return max(0.0, (when - datetime.now(timezone.utc)).total_seconds())
+
+
+def backoff_delay(attempt, retry_after=None):
+    """Задержка перед повтором: Retry-After сервера или экспоненциальная с полным джиттером"""
+    if retry_after is not None:
+        return min(retry_after, RETRY_AFTER_MAX)
+    return random.uniform(0, min(BACKOFF_MAX, BACKOFF_BASE * 2 ** attempt))
+
+
+class CircuitBreaker:
+    """Предохранитель по хостам: после серии неудач запросы к хосту не отправляются до истечения паузы"""
+
+    def __init__(self, threshold=BREAKER_THRESHOLD, cooldown=BREAKER_COOLDOWN):
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self._hosts = {}  # хост → [неудач подряд, время размыкания]
+
+    def check(self, url):
+        """Бросить CircuitOpenError, если хост отключён"""
+        host = urlsplit(url).netloc
+        failures, opened_at = self._hosts.get(host, (0, 0.0))
+        if failures < self.threshold:
+            return
+        now = time.monotonic()
+        if now - opened_at < self.cooldown:
+            raise CircuitOpenError(url, f"Хост {host} временно отключён после {failures} неудач")
+        # Пауза прошла: пропускаем одну пробную попытку, остальные ждут следующего окна
+        self._hosts[host] = [failures, now]
+        logging.info("Предохранитель для %s: пробный запрос", host)
+
+    def success(self, url):
+        self._hosts.pop(urlsplit(url).netloc, None)
+
+    def failure(self, url):
+        host = urlsplit(url).netloc
+        state = self._hosts.setdefault(host, [0, 0.0])
+        state[0] += 1
+        if state[0] == self.threshold:
+            state[1] = time.monotonic()
+            logging.error("Предохранитель сработал: хост %s отключён на %s с", host, self.cooldown)
+
+
+async def with_retries(url, attempt_fn, breaker=None, retries=MAX_RETRIES):
+    """Выполнить attempt_fn() с повторами и учётом предохранителя.
+
+    attempt_fn бросает RetryableStatus или сетевые ошибки для повторяемых сбоев и FetchError для окончательных.
+    """
+    for attempt in range(retries + 1):
+        if breaker:
+            breaker.check(url)
+        retry_after = None
+        try:
+            result = await attempt_fn()
+        except RetryableStatus as e:
+            reason = f"Ошибка HTTP {e.status}"
+            retry_after = e.retry_after
+            status = e.status
+        except (aiohttp.ClientError, asyncio.TimeoutError, OSError) as e:
+            reason = f"Сетевая ошибка {type(e).__name__}: {e}"
+            status = None
+        else:
+            if breaker:
+                breaker.success(url)
+            return result
+
+        if breaker:
+            breaker.failure(url)
+        if attempt == retries:
+            raise FetchError(url, f"{reason} (попыток: {attempt + 1})", status)
+        delay = backoff_delay(attempt, retry_after)
+        logging.warning("%s при запросе %s, повтор через %.1f с", reason, url, delay)
+        await asyncio.sleep(delay)
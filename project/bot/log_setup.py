@@ -0,0 +1,118 @@
+import atexit
+import logging
+import logging.handlers
+import queue
+import sys
+import time
+
+LOG_FORMAT = '%(asctime)s - %(levelname)s - %(message)s'
+
+# Все записи складываются в очередь, а в консоль и файлы их пишет фоновый поток
+_queue = queue.SimpleQueue()
+_listener = None
+_handlers = []
+_log_files = {}
+_claimed_modules = set()
+
+
+class LazyQueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler без форматирования в вызывающем потоке: сообщение собирается в фоновом потоке"""
+
+    def prepare(self, record):
+        return record
+
+
+class ModuleFilter(logging.Filter):
+    """Пропускает записи указанных модулей; при modules=None — записи всех остальных модулей"""
+
+    def __init__(self, modules=None):
+        super().__init__()
+        self.modules = frozenset(modules) if modules else None
+
+    def filter(self, record):
+        if self.modules is None:
+            return record.module not in _claimed_modules
+        return record.module in self.modules
+
+
+class RateLimitFilter(logging.Filter):
+    """Не больше rate записей в секунду с одной строки кода (с запасом burst).
+
+    Предупреждения и ошибки не ограничиваются. Число пропущенных записей добавляется к следующей.
+    """
+
+    def __init__(self, rate=5.0, burst=20):
+        super().__init__()
+        self.rate = rate
+        self.burst = burst
+        self._sites = {}
+
+    def filter(self, record):
+        if record.levelno >= logging.WARNING:
+            return True
+        key = (record.pathname, record.lineno)
+        now = time.monotonic()
+        tokens, updated, dropped = self._sites.get(key, (self.burst, now, 0))
+        tokens = min(self.burst, tokens + (now - updated) * self.rate)
+        if tokens < 1:
+            self._sites[key] = (tokens, now, dropped + 1)
+            return False
+        if dropped:
+            record.msg = f"{record.msg} (пропущено похожих записей: {dropped})"
+        self._sites[key] = (tokens - 1, now, 0)
+        return True
+
+
+def _stop_listener():
+    if _listener is not None:
+        _listener.stop()
+
+
+def setup_logging(log_file, modules=None, level=logging.INFO):
+    """Подключить неблокирующее логирование с записью в log_file.
+
+    modules — модули, чьи записи идут в этот файл; без них файл получает записи всех прочих модулей.
+    Повторный вызов с тем же файлом ничего не делает, поэтому модули можно импортировать в любом порядке.
+    """
+    global _listener
+    if log_file in _log_files:
+        return
+    formatter = logging.Formatter(LOG_FORMAT)
+
+    if _listener is None:
+        root = logging.getLogger()
+        for handler in root.handlers[:]:
+            root.removeHandler(handler)
+        queue_handler = LazyQueueHandler(_queue)
+        queue_handler.addFilter(RateLimitFilter())
+        root.addHandler(queue_handler)
+        root.setLevel(level)
+
+        console = logging.StreamHandler()  # Вывод в консоль
+        console.setFormatter(formatter)
+        _handlers.append(console)
+        atexit.register(_stop_listener)
+
+    _log_files[log_file] = modules
+    _claimed_modules.update(modules or ())
+    file_handler = logging.FileHandler(log_file, encoding='utf-8', delay=True)
+    file_handler.setFormatter(formatter)
+    file_handler.addFilter(ModuleFilter(modules))
+    _handlers.append(file_handler)
+
+    # Слушатель пересоздаётся с новым набором обработчиков, очередь остаётся той же
+    if _listener is not None:
+        _listener.stop()
+    _listener = logging.handlers.QueueListener(_queue, *_handlers, respect_handler_level=True)
+    _listener.start()
+
+
+def setup_worker_logging(level=logging.INFO):
+    """Логирование в процессах пула: у них нет фонового потока, поэтому пишем напрямую в stderr"""
+    root = logging.getLogger()
+    for handler in root.handlers[:]:
+        root.removeHandler(handler)
+    handler = logging.StreamHandler(sys.stderr)
+    handler.setFormatter(logging.Formatter(LOG_FORMAT))
+    root.addHandler(handler)
+    root.setLevel(level)
@@ -4,27 +4,31 @@ import logging
 import re
 import json
 import random
+from bisect import bisect_left
+from collections import OrderedDict
+from functools import lru_cache
+from html import escape
 from aiogram import Bot, Dispatcher, Router
 from aiogram.filters import CommandStart, Command
-from aiogram.types import Message, InlineKeyboardButton, InlineKeyboardMarkup, CallbackQuery
+from aiogram.types import (Message, InlineKeyboardButton, InlineKeyboardMarkup, CallbackQuery, InlineQuery,
+                           InlineQueryResultPhoto, InlineQueryResultCachedPhoto, InlineQueryResultArticle,
+                           InputTextMessageContent)
 from aiogram.fsm.context import FSMContext
 from aiogram.fsm.state import State, StatesGroup
 from aiogram.fsm.storage.memory import MemoryStorage
+from aiogram.exceptions import TelegramBadRequest, TelegramRetryAfter
 from apscheduler.schedulers.asyncio import AsyncIOScheduler
 from apscheduler.triggers.cron import CronTrigger
 from datetime import datetime
 from dotenv import load_dotenv
 import os
+from log_setup import setup_logging
+from db import Database
+from broadcast import BroadcastDispatcher
+from catalog import CatalogStore, CardCache, FilterCache, search_animal_ids, filter_signature
 
-# Настройка логирования
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.StreamHandler(),
-        logging.FileHandler('bot.log', encoding='utf-8')
-    ]
-)
+# Настройка логирования: запись в консоль и bot.log идёт в фоновом потоке
+setup_logging('bot.log')
 
 # Загрузка токена из .env
 load_dotenv()
@@ -40,33 +44,66 @@ router = Router()
 # Путь к базе данных
 DB_PATH = os.path.join(os.path.dirname(__file__), 'pets.db')
 
+# Соединения с базой в отдельных потоках: запросы не блокируют обработчики
+db = Database(DB_PATH)
+
+# file_id фото в Telegram по ссылке (зеркало таблицы photo_cache)
+photo_ids = {}
+# Настройки каналов рассылки в памяти (chat_id → канал с разобранными фильтрами), зеркало таблицы channels
+channel_configs = {}
+channels_loaded = False
+
 # Глобальный планировщик
 scheduler = AsyncIOScheduler()
 
-
-# Подключение к базе данных
-def get_db_connection():
-    return sqlite3.connect(DB_PATH)
+# Колонки животного, которые читает бот (подробности заполняет парсер со страницы животного)
+ANIMAL_COLUMNS = ("id", "name", "age", "sex", "photo_url", "description",
+                  "about", "breed", "color", "vaccinated", "sterilized", "sex_norm", "age_years", "row_version")
+
+# Каталог животных в памяти: все чтения идут из снимка, который обновляется после записи парсера
+catalog_store = CatalogStore(db, ANIMAL_COLUMNS)
+# Результаты отбора по фильтрам (списки, возврат к списку, рассылка) для текущей версии каталога
+filter_cache = FilterCache()
+# Все сообщения рассылки (волны и задачи планировщика) идут через общие лимиты Telegram
+broadcaster = BroadcastDispatcher()
+
+# Подписи подробностей в карточке питомца
+DETAIL_TITLES = (
+    ("breed", "🐕 <b>Порода:</b>"),
+    ("color", "🎨 <b>Окрас:</b>"),
+    ("vaccinated", "💉 <b>Прививки:</b>"),
+    ("sterilized", "✂️ <b>Стерилизация:</b>"),
+)
+CAPTION_LIMIT = 1024  # Ограничение Telegram на длину подписи к фото
+INLINE_RESULTS = 20   # Карточек в ответе на inline-запрос (Telegram допускает до 50)
+LIST_PAGE_SIZE = 10   # Животных на одной странице списка
+LIST_PAGE_CACHE = 128  # Сколько готовых страниц списков держать в памяти
+LIST_TITLES = {"view_all": "Все доступные животные", "show_filtered": "Результаты по фильтрам"}
+
+
+# Создание таблиц бота
+def create_tables(conn):
+    c = conn.cursor()
+    c.execute("SELECT name FROM sqlite_master WHERE type='table' AND name='channels'")
+    if not c.fetchone():
+        c.execute("""
+            CREATE TABLE channels (
+                chat_id INTEGER PRIMARY KEY,
+                filters TEXT,
+                schedule TEXT,
+                is_active INTEGER DEFAULT 1
+            )
+        """)
+        logging.info("Таблица channels создана")
+    # file_id фото, уже загруженных в Telegram (таблицу также создаёт и чистит парсер)
+    c.execute("CREATE TABLE IF NOT EXISTS photo_cache (photo_url TEXT PRIMARY KEY, file_id TEXT)")
+    conn.commit()
 
 
 # Инициализация базы данных
-def init_db():
+async def init_db():
     try:
-        conn = get_db_connection()
-        c = conn.cursor()
-        c.execute("SELECT name FROM sqlite_master WHERE type='table' AND name='channels'")
-        if not c.fetchone():
-            c.execute("""
-                CREATE TABLE channels (
-                    chat_id INTEGER PRIMARY KEY,
-                    filters TEXT,
-                    schedule TEXT,
-                    is_active INTEGER DEFAULT 1
-                )
-            """)
-            logging.info("Таблица channels создана")
-        conn.commit()
-        conn.close()
+        await db.run(create_tables)
     except sqlite3.Error as e:
         logging.error(f"Ошибка при инициализации базы данных: {e}")
 
@@ -82,40 +119,6 @@ class FilterStates(StatesGroup):
     waiting_channel_filters = State()
 
 
-# Нормализация возраста
-def normalize_age(age_str):
-    """Извлечь числовое значение возраста из строки"""
-    if not age_str or age_str.lower() in ["не указан", "", "unknown"]:
-        logging.debug(f"Возраст не указан: {age_str}")
-        return None
-    match = re.search(r'\d+', age_str)
-    if match:
-        age = int(match.group())
-        logging.debug(f"Нормализованный возраст: {age_str} → {age}")
-        return age
-    logging.debug(f"Не удалось нормализовать возраст: {age_str}")
-    return None
-
-
-# Нормализация пола
-def normalize_sex(sex_str):
-    """Привести значение пола к 'Мужской' или 'Женский'"""
-    if not sex_str or sex_str.lower() in ["не указан", "", "unknown"]:
-        logging.debug(f"Пол не указан: {sex_str}")
-        return None
-    sex_str = sex_str.lower()
-    male_keywords = ["мужской", "самец", "male", "boy", "м", "♂"]
-    female_keywords = ["женский", "самка", "female", "girl", "ж", "♀"]
-    if any(keyword in sex_str for keyword in male_keywords):
-        logging.debug(f"Нормализованный пол: {sex_str} → Мужской")
-        return "Мужской"
-    if any(keyword in sex_str for keyword in female_keywords):
-        logging.debug(f"Нормализованный пол: {sex_str} → Женский")
-        return "Женский"
-    logging.debug(f"Не удалось нормализовать пол: {sex_str}")
-    return None
-
-
 def parse_schedule(schedule_str: str) -> str:
     """Конвертировать человеко-читаемую строку расписания в cron-выражение"""
     schedule_str = schedule_str.lower().strip()
@@ -213,6 +216,64 @@ def parse_schedule(schedule_str: str) -> str:
         raise ValueError(error_message)
 
 
+def animal_caption(animal: dict) -> str:
+    """Текст карточки питомца с подробностями, если они есть"""
+    # Все значения взяты с сайта приюта и экранируются перед вставкой в HTML-разметку
+    field = {key: escape(str(value)) for key, value in animal.items() if value}
+    text = (
+        f"🐾 <b>{field.get('name', '')}</b>\n\n"
+        f"📅 <b>Возраст:</b> {field.get('age', '')}\n"
+        f"⚤ <b>Пол:</b> {field.get('sex', '')}"
+    )
+    for key, title in DETAIL_TITLES:
+        if key in field:
+            text += f"\n{title} {field[key]}"
+    about = animal.get("about")
+    room = CAPTION_LIMIT - len(text) - 2
+    if about and room > 20:
+        if len(about) > room:
+            about = about[:room - 1].rstrip() + "…"
+        text += f"\n\n{escape(about)}"
+    return text
+
+
+def site_url(animal: dict) -> str:
+    """Ссылка на страницу животного на сайте приюта"""
+    return animal['description'] if animal['description'].startswith('http') else 'https://less-homeless.com'
+
+
+def render_animal_card(animal: dict) -> dict:
+    """Готовая карточка питомца для show_animal_details: фото, подпись и клавиатура"""
+    return {
+        "name": animal["name"],
+        "photo_url": animal["photo_url"],
+        "caption": animal_caption(animal),
+        "keyboard": InlineKeyboardMarkup(inline_keyboard=[
+            [InlineKeyboardButton(text="🌐 Перейти на сайт", url=site_url(animal))],
+            [InlineKeyboardButton(text="🔙 Назад к списку", callback_data="back_to_list")]
+        ]),
+    }
+
+
+def inline_result(animal):
+    """Результат inline-запроса: фото по file_id или ссылке, а без фото — текстовая карточка"""
+    caption = animal_caption(animal)
+    keyboard = InlineKeyboardMarkup(inline_keyboard=[
+        [InlineKeyboardButton(text="🌐 Перейти на сайт", url=site_url(animal))]
+    ])
+    common = dict(id=str(animal["id"]), caption=caption, parse_mode="HTML", reply_markup=keyboard)
+    file_id = photo_ids.get(animal["photo_url"])
+    if file_id:
+        return InlineQueryResultCachedPhoto(photo_file_id=file_id, title=animal["name"], **common)
+    if animal["photo_url"]:
+        return InlineQueryResultPhoto(photo_url=animal["photo_url"], thumbnail_url=animal["photo_url"],
+                                      title=animal["name"], **common)
+    return InlineQueryResultArticle(
+        id=common["id"], title=animal["name"], description=animal["age"] or None, reply_markup=keyboard,
+        input_message_content=InputTextMessageContent(message_text=caption, parse_mode="HTML")
+    )
+
+
 def cron_to_human_readable(cron: str) -> str:
     """Конвертировать cron-выражение в человеко-читаемый формат"""
     try:
@@ -251,7 +312,13 @@ def cron_to_human_readable(cron: str) -> str:
         return "Некорректное расписание"
 
 # ======================== Клавиатуры ========================
+# Клавиатуры строятся один раз на каждый набор входных данных и переиспользуются между нажатиями.
+# Закэшированные разметки общие для всех пользователей, поэтому их нельзя изменять после построения.
 
+KEYBOARD_CACHE_SIZE = 256  # Сколько клавиатур возраста помнить (зависят от диапазона и числа животных)
+
+
+@lru_cache(maxsize=None)
 def main_keyboard():
     """Главное меню"""
     return InlineKeyboardMarkup(inline_keyboard=[
@@ -261,19 +328,27 @@ def main_keyboard():
     ])
 
 
+def selected_flags(selected_filters: dict) -> tuple:
+    """Какие фильтры выбраны: (возраст, пол, имя)"""
+    age_selected = "age_min" in selected_filters and "age_max" in selected_filters
+    return age_selected, "sex" in selected_filters, "name" in selected_filters
+
+
+def mark_selected(text: str, selected: bool) -> str:
+    return f"✔ {text}" if selected else text
+
+
 def filters_keyboard(selected_filters: dict) -> InlineKeyboardMarkup:
     """Клавиатура выбора фильтров для интерактивного режима"""
+    return _filters_keyboard(*selected_flags(selected_filters))
 
-    def mark_selected(text, key):
-        if key == "age":
-            age_selected = "age_min" in selected_filters and "age_max" in selected_filters
-            return f"✔ {text}" if age_selected else text
-        return f"✔ {text}" if key in selected_filters else text
 
+@lru_cache(maxsize=None)
+def _filters_keyboard(age: bool, sex: bool, name: bool) -> InlineKeyboardMarkup:
     return InlineKeyboardMarkup(inline_keyboard=[
-        [InlineKeyboardButton(text=mark_selected("📅 Возраст", "age"), callback_data="filter_age")],
-        [InlineKeyboardButton(text=mark_selected("⚤ Пол", "sex"), callback_data="filter_sex")],
-        [InlineKeyboardButton(text=mark_selected("🔎 Имя", "name"), callback_data="filter_name")],
+        [InlineKeyboardButton(text=mark_selected("📅 Возраст", age), callback_data="filter_age")],
+        [InlineKeyboardButton(text=mark_selected("⚤ Пол", sex), callback_data="filter_sex")],
+        [InlineKeyboardButton(text=mark_selected("🔎 Имя", name), callback_data="filter_name")],
         [InlineKeyboardButton(text="✅ Показать", callback_data="show_filtered")],
         [InlineKeyboardButton(text="🔙 Назад", callback_data="back_to_main")]
     ])
@@ -281,33 +356,34 @@ def filters_keyboard(selected_filters: dict) -> InlineKeyboardMarkup:
 
 def broadcast_filters_keyboard(selected_filters: dict) -> InlineKeyboardMarkup:
     """Клавиатура выбора фильтров для рассылки"""
+    return _broadcast_filters_keyboard(*selected_flags(selected_filters))
 
-    def mark_selected(text, key):
-        if key == "age":
-            age_selected = "age_min" in selected_filters and "age_max" in selected_filters
-            return f"✔ {text}" if age_selected else text
-        return f"✔ {text}" if key in selected_filters else text
 
+@lru_cache(maxsize=None)
+def _broadcast_filters_keyboard(age: bool, sex: bool, name: bool) -> InlineKeyboardMarkup:
     return InlineKeyboardMarkup(inline_keyboard=[
-        [InlineKeyboardButton(text=mark_selected("📅 Возраст", "age"), callback_data="broadcast_filter_age")],
-        [InlineKeyboardButton(text=mark_selected("⚤ Пол", "sex"), callback_data="broadcast_filter_sex")],
-        [InlineKeyboardButton(text=mark_selected("🔎 Имя", "name"), callback_data="broadcast_filter_name")],
+        [InlineKeyboardButton(text=mark_selected("📅 Возраст", age), callback_data="broadcast_filter_age")],
+        [InlineKeyboardButton(text=mark_selected("⚤ Пол", sex), callback_data="broadcast_filter_sex")],
+        [InlineKeyboardButton(text=mark_selected("🔎 Имя", name), callback_data="broadcast_filter_name")],
         [InlineKeyboardButton(text="✅ Сохранить", callback_data="save_broadcast_filters")],
         [InlineKeyboardButton(text="🔙 Назад", callback_data="back_to_broadcast_filters")]
     ])
 
 
-def sex_keyboard(prefix: str = "") -> InlineKeyboardMarkup:
-    """Клавиатура выбора пола с поддержкой префикса"""
+@lru_cache(maxsize=KEYBOARD_CACHE_SIZE)
+def sex_keyboard(prefix: str = "", counts: tuple = None) -> InlineKeyboardMarkup:
+    """Клавиатура выбора пола с поддержкой префикса; counts — число животных (мужской, женский)"""
+    male, female = (f" ({count})" for count in counts) if counts else ("", "")
     return InlineKeyboardMarkup(inline_keyboard=[
-        [InlineKeyboardButton(text="Мужской", callback_data=f"{prefix}sex_Мужской")],
-        [InlineKeyboardButton(text="Женский", callback_data=f"{prefix}sex_Женский")],
+        [InlineKeyboardButton(text=f"Мужской{male}", callback_data=f"{prefix}sex_Мужской")],
+        [InlineKeyboardButton(text=f"Женский{female}", callback_data=f"{prefix}sex_Женский")],
         [InlineKeyboardButton(text="🔙 Назад", callback_data=f"back_to_{prefix}filters")]
     ])
 
 
-def age_keyboard(start_age: int, end_age: int, mode: str, prefix: str = "") -> InlineKeyboardMarkup:
-    """Клавиатура для выбора возраста с поддержкой префикса"""
+@lru_cache(maxsize=KEYBOARD_CACHE_SIZE)
+def age_keyboard(start_age: int, end_age: int, mode: str, prefix: str = "", counts: tuple = None) -> InlineKeyboardMarkup:
+    """Клавиатура для выбора возраста с поддержкой префикса; counts — число животных для каждой кнопки"""
     buttons = [[]]
     if end_age < start_age:
         logging.warning(f"Некорректный диапазон возраста: start={start_age}, end={end_age}")
@@ -316,11 +392,13 @@ def age_keyboard(start_age: int, end_age: int, mode: str, prefix: str = "") -> I
         if len(buttons[-1]) >= 3:
             buttons.append([])
         callback_data = f"{prefix}age_{mode}_{age}"
-        buttons[-1].append(InlineKeyboardButton(text=str(age), callback_data=callback_data))
+        text = f"{age} ({counts[age - start_age]})" if counts else str(age)
+        buttons[-1].append(InlineKeyboardButton(text=text, callback_data=callback_data))
     buttons.append([InlineKeyboardButton(text="🔙 Назад", callback_data=f"back_to_{prefix}filters")])
     return InlineKeyboardMarkup(inline_keyboard=buttons)
 
 
+@lru_cache(maxsize=None)
 def broadcast_management_keyboard() -> InlineKeyboardMarkup:
     """Клавиатура управления рассылкой"""
     return InlineKeyboardMarkup(inline_keyboard=[
@@ -333,93 +411,76 @@ def broadcast_management_keyboard() -> InlineKeyboardMarkup:
 
 # ======================== Функции работы с базой данных ========================
 
-def get_all_animals():
-    """Получить всех животных из базы"""
-    try:
-        conn = get_db_connection()
-        c = conn.cursor()
-        c.execute("SELECT id, name, age, sex, photo_url, description FROM animals")
-        animals = [{"id": row[0], "name": row[1], "age": row[2], "sex": row[3],
-                    "photo_url": row[4], "description": row[5]} for row in c.fetchall()]
-        conn.close()
-        logging.info(f"Получено {len(animals)} животных из базы")
-        return animals
-    except sqlite3.Error as e:
-        logging.error(f"Ошибка при получении всех животных: {e}")
-        return []
+async def get_all_animals():
+    """Получить всех животных (из снимка каталога)"""
+    snapshot = await catalog_store.get()
+    logging.debug("Получено %s животных из каталога", len(snapshot.animals))
+    return list(snapshot.animals)
 
 
-def get_animals_by_filters(filters: dict):
-    """Получить животных по фильтрам"""
-    try:
-        conn = get_db_connection()
-        c = conn.cursor()
-        query = "SELECT id, name, age, sex, photo_url, description FROM animals WHERE 1=1"
-        params = []
+async def get_animal(animal_id: int):
+    """Получить одно животное по id"""
+    return (await catalog_store.get()).get(animal_id)
+
 
+async def get_animals_by_filters(filters: dict):
+    """Получить животных по фильтрам"""
+    snapshot = await catalog_store.get()
+    ids = filter_cache.get(snapshot.version, filters)
+    if ids is None:
+        # Пол, возраст и вхождение подстроки в имя проверяются по индексам снимка
+        found = snapshot.filter(filters)
         if "name" in filters:
-            query += " AND name LIKE ?"
-            params.append(f"%{filters['name']}%")
-            logging.info(f"Применён фильтр по имени: {filters['name']}")
-
-        if "sex" in filters:
-            query += " AND sex = ?"
-            params.append(filters["sex"])
-            logging.info(f"Применён фильтр по полу: {filters['sex']}")
-
-        c.execute(query, params)
-        animals = [{"id": row[0], "name": row[1], "age": row[2], "sex": row[3],
-                    "photo_url": row[4], "description": row[5]} for row in c.fetchall()]
-        logging.info(f"Найдено {len(animals)} животных после SQL-фильтров")
-
-        if "age_min" in filters and "age_max" in filters:
-            age_min = filters["age_min"]
-            age_max = filters["age_max"]
-            filtered_animals = []
-            for animal in animals:
-                age = normalize_age(animal["age"])
-                if age is not None and age_min <= age <= age_max:
-                    filtered_animals.append(animal)
-            animals = filtered_animals
-            logging.info(f"После фильтра по возрасту ({age_min}-{age_max}): {len(animals)} животных")
-
-        for animal in animals:
-            animal["sex"] = normalize_sex(animal["sex"]) or "Не указан"
-
-        conn.close()
-        return animals
+            # Сначала животные, у которых слово клички начинается с запроса (лучшие совпадения первыми,
+            # "ё" и "е" не различаются), затем остальные клички, содержащие запрос
+            rest = {key: value for key, value in filters.items() if key != "name"}
+            ranked = [animal for animal in map(snapshot.get, await search_animal_ids(db, filters["name"], limit=-1,
+                                                                                     column="name"))
+                      if animal is not None and snapshot.matches(animal, rest)]
+            ranked_ids = {animal["id"] for animal in ranked}
+            found = ranked + [animal for animal in found if animal["id"] not in ranked_ids]
+        ids = tuple(animal["id"] for animal in found)
+        filter_cache.put(snapshot.version, filters, ids)
+    animals = [{**animal, "sex": animal["sex_norm"] or "Не указан"} for animal in map(snapshot.get, ids)]
+    logging.debug("Найдено %s животных по фильтрам %s", len(animals), filters)
+    return animals
+
+
+async def get_photo_file_id(photo_url: str):
+    """Получить file_id ранее отправленного фото"""
+    if photo_url in photo_ids:
+        return photo_ids[photo_url]
+    try:
+        row = await db.fetchone("SELECT file_id FROM photo_cache WHERE photo_url = ?", (photo_url,))
+        photo_ids[photo_url] = row[0] if row else None
+        return row[0] if row else None
     except sqlite3.Error as e:
-        logging.error(f"Ошибка при фильтрации животных: {e}")
-        return []
+        logging.error(f"Ошибка при получении file_id фото: {e}")
+        return None
 
 
-def get_max_age():
-    """Получить максимальный возраст из базы"""
+async def set_photo_file_id(photo_url: str, file_id: str = None):
+    """Запомнить file_id фото (или забыть, если file_id=None)"""
+    photo_ids[photo_url] = file_id
     try:
-        conn = get_db_connection()
-        c = conn.cursor()
-        c.execute("SELECT age FROM animals")
-        ages = [normalize_age(row[0]) for row in c.fetchall() if normalize_age(row[0]) is not None]
-        conn.close()
-        max_age = max(ages) if ages else 10
-        logging.info(f"Максимальный возраст: {max_age}")
-        return max_age
+        if file_id:
+            await db.execute("INSERT OR REPLACE INTO photo_cache (photo_url, file_id) VALUES (?, ?)",
+                             (photo_url, file_id))
+        else:
+            await db.execute("DELETE FROM photo_cache WHERE photo_url = ?", (photo_url,))
     except sqlite3.Error as e:
-        logging.error(f"Ошибка при получении максимального возраста: {e}")
-        return 10
+        logging.error(f"Ошибка при сохранении file_id фото: {e}")
 
 
-def add_channel(chat_id: int, filters: dict = None, schedule: str = "0 10 * * *"):
+async def add_channel(chat_id: int, filters: dict = None, schedule: str = "0 10 * * *"):
     """Добавить канал в базу для рассылки"""
     try:
-        conn = get_db_connection()
-        c = conn.cursor()
         filters_json = json.dumps(filters) if filters else "{}"
         logging.info(f"Сохранение канала {chat_id} с фильтрами {filters_json} и расписанием {schedule}")
-        c.execute("INSERT OR REPLACE INTO channels (chat_id, filters, schedule, is_active) VALUES (?, ?, ?, 1)",
-                  (chat_id, filters_json, schedule))
-        conn.commit()
-        conn.close()
+        await db.execute("INSERT OR REPLACE INTO channels (chat_id, filters, schedule, is_active) VALUES (?, ?, ?, 1)",
+                         (chat_id, filters_json, schedule))
+        channel_configs[chat_id] = {"chat_id": chat_id, "filters": json.loads(filters_json),
+                                    "schedule": schedule, "is_active": 1}
         logging.info(f"Канал {chat_id} успешно добавлен в базу")
 
         # Динамически добавляем задачу в планировщик
@@ -428,32 +489,51 @@ def add_channel(chat_id: int, filters: dict = None, schedule: str = "0 10 * * *"
         logging.error(f"Ошибка при добавлении канала: {e}")
 
 
-def get_channels():
-    """Получить все каналы из базы"""
+def channel_from_row(row):
+    return {"chat_id": row[0], "filters": json.loads(row[1]) if row[1] else {},
+            "schedule": row[2], "is_active": row[3]}
+
+
+async def get_channels():
+    """Получить все каналы (из базы при первом обращении, дальше из памяти)"""
+    global channels_loaded
+    if not channels_loaded:
+        try:
+            rows = await db.fetchall("SELECT chat_id, filters, schedule, is_active FROM channels")
+        except sqlite3.Error as e:
+            logging.error(f"Ошибка при получении каналов: {e}")
+            return []
+        # Каналы, изменённые во время загрузки, уже лежат в памяти в актуальном виде
+        for row in rows:
+            channel_configs.setdefault(row[0], channel_from_row(row))
+        channels_loaded = True
+        logging.debug("Загружено %s каналов", len(channel_configs))
+    return list(channel_configs.values())
+
+
+async def get_channel(chat_id: int):
+    """Получить один канал по chat_id или None"""
+    channel = channel_configs.get(chat_id)
+    if channel is not None or channels_loaded:
+        return channel
     try:
-        conn = get_db_connection()
-        c = conn.cursor()
-        c.execute("SELECT chat_id, filters, schedule, is_active FROM channels")
-        channels = [{"chat_id": row[0], "filters": json.loads(row[1]) if row[1] else {},
-                     "schedule": row[2], "is_active": row[3]} for row in c.fetchall()]
-        conn.close()
-        logging.info(f"Получено {len(channels)} каналов: {channels}")
-        return channels
+        row = await db.fetchone("SELECT chat_id, filters, schedule, is_active FROM channels WHERE chat_id = ?",
+                                (chat_id,))
     except sqlite3.Error as e:
-        logging.error(f"Ошибка при получении каналов: {e}")
-        return []
+        logging.error(f"Ошибка при получении канала {chat_id}: {e}")
+        return None
+    if row is None:
+        return None
+    channel = channel_configs[chat_id] = channel_from_row(row)
+    return channel
 
 
-def remove_channel(chat_id: int):
+async def remove_channel(chat_id: int):
     """Удалить канал из базы и задачу из планировщика"""
     try:
         # Удаление канала из базы данных
-        conn = get_db_connection()
-        c = conn.cursor()
-        c.execute("DELETE FROM channels WHERE chat_id = ?", (chat_id,))
-        affected_rows = c.rowcount
-        conn.commit()
-        conn.close()
+        affected_rows = await db.execute("DELETE FROM channels WHERE chat_id = ?", (chat_id,))
+        channel_configs.pop(chat_id, None)
         logging.info(f"Канал {chat_id} удалён из базы, затронуто строк: {affected_rows}")
 
         # Удаление задачи из планировщика
@@ -497,49 +577,69 @@ def schedule_broadcast(chat_id: int, schedule: str):
         logging.error(f"Ошибка при добавлении задачи для канала {chat_id}: {e}")
 
 
-async def broadcast_animal_for_channel(chat_id: int):
-    """Отправить случайного питомца в указанный канал"""
-    channels = get_channels()
-    channel = next((c for c in channels if c["chat_id"] == chat_id), None)
+async def send_animal_photo(send, photo_url: str, **kwargs):
+    """Отправить фото через send (answer_photo / send_photo), по возможности по сохранённому file_id.
+
+    Telegram не скачивает фото повторно с сайта приюта: после первой отправки используется file_id.
+    """
+    file_id = await get_photo_file_id(photo_url) if photo_url else None
+    if file_id:
+        try:
+            return await send(photo=file_id, **kwargs)
+        except TelegramBadRequest as e:
+            logging.warning(f"file_id для {photo_url} недействителен, отправка по ссылке: {e}")
+            await set_photo_file_id(photo_url, None)
+    message = await send(photo=photo_url, **kwargs)
+    if photo_url and message.photo:
+        await set_photo_file_id(photo_url, message.photo[-1].file_id)
+    return message
+
+
+async def prepare_broadcast(chat_id: int):
+    """Выбрать случайного питомца для канала; возвращает функцию отправки или None, если отправлять нечего"""
+    channel = await get_channel(chat_id)
 
     if not channel:
         logging.error(f"Канал {chat_id} не найден в базе")
-        return
+        return None
 
     if not channel["is_active"]:
         logging.info(f"Канал {chat_id} неактивен, пропуск")
-        return
+        return None
 
     filters = channel["filters"]
-    logging.info(f"Применение фильтров для канала {chat_id}: {filters}")
-    animals = get_animals_by_filters(filters)
+    logging.debug("Применение фильтров для канала %s: %s", chat_id, filters)
+    animals = await get_animals_by_filters(filters)
 
     if not animals:
-        logging.info(f"Для канала {chat_id} не найдено животных по фильтрам {filters}")
-        return
+        logging.info("Для канала %s не найдено животных по фильтрам %s", chat_id, filters)
+        return None
 
     animal = random.choice(animals)
-    text = (
-        f"🐾 <b>{animal['name']}</b>\n\n"
-        f"📅 <b>Возраст:</b> {animal['age']}\n"
-        f"⚤ <b>Пол:</b> {animal['sex']}"
-    )
+    text = animal_caption(animal)
     keyboard = InlineKeyboardMarkup(inline_keyboard=[
-        [InlineKeyboardButton(text="🌐 Перейти на сайт", url=animal['description'] if animal['description'].startswith(
-            'http') else 'https://less-homeless.com')]
+        [InlineKeyboardButton(text="🌐 Перейти на сайт", url=site_url(animal))]
     ])
 
-    try:
-        await bot.send_photo(
-            chat_id=chat_id,
-            photo=animal['photo_url'],
-            caption=text,
-            parse_mode="HTML",
-            reply_markup=keyboard
-        )
-        logging.info(f"Отправлен питомец {animal['name']} в канал {chat_id}")
-    except Exception as e:
-        logging.error(f"Ошибка при отправке фото в канал {chat_id}: {e}")
+    async def deliver():
+        # TelegramRetryAfter пробрасывается диспетчеру: он повторит отправку после паузы
+        try:
+            await send_animal_photo(
+                bot.send_photo,
+                animal['photo_url'],
+                chat_id=chat_id,
+                caption=text,
+                parse_mode="HTML",
+                reply_markup=keyboard
+            )
+            logging.info("Отправлен питомец %s в канал %s", animal['name'], chat_id)
+            return True
+        except TelegramRetryAfter:
+            raise
+        except Exception as e:
+            logging.error(f"Ошибка при отправке фото в канал {chat_id}: {e}")
+        # Текстовая карточка — ещё одно сообщение, оно тоже проходит через общий лимит
+        await broadcaster.limiter.acquire()
         try:
             await bot.send_message(
                 chat_id=chat_id,
@@ -548,20 +648,94 @@ async def broadcast_animal_for_channel(chat_id: int):
                 reply_markup=keyboard
             )
             logging.info(f"Отправлен текстовый питомец {animal['name']} в канал {chat_id}")
+            return True
+        except TelegramRetryAfter:
+            raise
         except Exception as e:
             logging.error(f"Ошибка при отправке текста в канал {chat_id}: {e}")
+            return False
+
+    return deliver
+
+
+async def broadcast_animal_for_channel(chat_id: int):
+    """Отправить случайного питомца в указанный канал"""
+    deliver = await prepare_broadcast(chat_id)
+    if deliver:
+        await broadcaster.send(chat_id, deliver)
 
 
 async def broadcast_animal():
-    """Ручной запуск рассылки во все активные каналы (для отладки)"""
-    channels = get_channels()
+    """Ручной запуск рассылки во все активные каналы (для отладки); возвращает отчёт о волне"""
+    channels = await get_channels()
     logging.info(f"Ручной запуск рассылки для {len(channels)} каналов")
 
+    jobs = []
     for channel in channels:
-        if not channel["is_active"]:
-            logging.info(f"Канал {channel['chat_id']} неактивен, пропуск")
-            continue
-        await broadcast_animal_for_channel(channel["chat_id"])
+        deliver = await prepare_broadcast(channel["chat_id"])
+        if deliver:
+            jobs.append((channel["chat_id"], deliver))
+    return await broadcaster.wave(jobs)
+
+
+# Готовые карточки питомцев: повторное открытие карточки не обращается к базе
+card_cache = CardCache(render_animal_card)
+
+# Готовые страницы списков: (версия каталога, тип списка, подпись фильтров, id начала) → (текст, клавиатура, id начала)
+list_pages = OrderedDict()
+
+
+async def list_view(list_type: str, filters: dict, start_id: int = None):
+    """Страница списка животных, начинающаяся с животного start_id (или первая), либо None для пустого списка.
+
+    Страницы задаются курсором по id: кнопки ◀️/▶️ несут id первого животного соседней страницы,
+    поэтому размер клавиатуры не зависит от размера каталога. Порядок списка сохраняется:
+    при поиске по имени лучшие совпадения остаются первыми.
+    """
+    snapshot = await catalog_store.get()
+    key = (snapshot.version, list_type, filter_signature(filters), start_id)
+    view = list_pages.get(key)
+    if view is not None:
+        list_pages.move_to_end(key)
+        return view
+
+    if list_type == "show_filtered":
+        animals = await get_animals_by_filters(filters)
+    else:
+        animals = await get_all_animals()
+    if not animals:
+        return None
+    ids = [animal["id"] for animal in animals]
+    start = 0
+    if start_id is not None:
+        start = {animal_id: i for i, animal_id in enumerate(ids)}.get(start_id)
+        if start is None:
+            # Животное пропало из списка: в списке по возрастанию id берётся следующее за ним,
+            # в результатах поиска по имени — первая страница
+            start = 0 if list_type == "show_filtered" and "name" in filters else bisect_left(ids, start_id)
+    # Страницы всегда начинаются с кратной LIST_PAGE_SIZE позиции; если животные страницы пропали
+    # после обновления каталога, показывается последняя страница
+    if start >= len(ids):
+        start = len(ids) - 1
+    start = start // LIST_PAGE_SIZE * LIST_PAGE_SIZE
+    page = animals[start:start + LIST_PAGE_SIZE]
+
+    buttons = [[InlineKeyboardButton(text=f"🐾 {animal['name']}", callback_data=f"animal_{animal['id']}")]
+               for animal in page]
+    navigation = []
+    if start > 0:
+        navigation.append(InlineKeyboardButton(
+            text="◀️", callback_data=f"list_from_{ids[start - LIST_PAGE_SIZE]}"))
+    if start + LIST_PAGE_SIZE < len(ids):
+        navigation.append(InlineKeyboardButton(
+            text="▶️", callback_data=f"list_from_{ids[start + LIST_PAGE_SIZE]}"))
+    if navigation:
+        buttons.append(navigation)
+    text = f"{LIST_TITLES[list_type]} ({start + 1}–{start + len(page)} из {len(ids)}):"
+    view = list_pages[key] = (text, InlineKeyboardMarkup(inline_keyboard=buttons), ids[start])
+    if len(list_pages) > LIST_PAGE_CACHE:
+        list_pages.popitem(last=False)
+    return view
 
 
 # ======================== Обработчики ========================
@@ -615,8 +789,8 @@ async def process_schedule(message: Message, state: FSMContext):
 @router.message(Command("list_channels"))
 async def cmd_list_channels(message: Message):
     """Показать список каналов"""
-    channels = get_channels()
-    logging.info(f"Запрос списка каналов, получено: {channels}")
+    channels = await get_channels()
+    logging.debug("Запрос списка каналов, получено: %s", len(channels))
     if not channels:
         await message.answer("Нет привязанных каналов.")
         return
@@ -660,7 +834,7 @@ async def process_remove_channel(callback: CallbackQuery):
         chat_id = int(callback.data.split("_")[2])
         logging.info(f"Попытка удаления канала {chat_id}")
 
-        if remove_channel(chat_id):
+        if await remove_channel(chat_id):
             await callback.message.edit_text(
                 f"Канал {chat_id} успешно удалён.", reply_markup=broadcast_management_keyboard()
             )
@@ -679,7 +853,7 @@ async def process_remove_channel(callback: CallbackQuery):
 @router.callback_query(lambda c: c.data == "start_remove_channel")
 async def start_remove_channel(callback: CallbackQuery):
     """Начать процесс удаления канала, показав список каналов для выбора"""
-    channels = get_channels()
+    channels = await get_channels()
     if not channels:
         await callback.message.edit_text(
             "Нет привязанных каналов.", reply_markup=broadcast_management_keyboard()
@@ -699,8 +873,8 @@ async def start_remove_channel(callback: CallbackQuery):
 @router.callback_query(lambda c: c.data == "list_channels")
 async def callback_list_channels(callback: CallbackQuery):
     """Показать список каналов через callback в красивом формате"""
-    channels = get_channels()
-    logging.info(f"Callback запрос списка каналов, получено: {channels}")
+    channels = await get_channels()
+    logging.debug("Callback запрос списка каналов, получено: %s", len(channels))
 
     if not channels:
         await callback.message.edit_text(
@@ -741,18 +915,15 @@ async def callback_list_channels(callback: CallbackQuery):
 @router.callback_query(lambda c: c.data == "view_all")
 async def show_all_animals(callback: CallbackQuery, state: FSMContext):
     """Показать всех животных"""
-    animals = get_all_animals()
-    if not animals:
+    view = await list_view("view_all", {})
+    if not view:
         await callback.answer("Животных пока нет в базе.", show_alert=True)
         return
 
-    keyboard = InlineKeyboardMarkup(inline_keyboard=[
-        [InlineKeyboardButton(text=f"🐾 {animal['name']}", callback_data=f"animal_{animal['id']}")]
-        for animal in animals
-    ])
-    await state.update_data(list_type="view_all")
-    logging.info("Показан полный список животных")
-    await callback.message.answer("Все доступные животные:", reply_markup=keyboard)
+    text, keyboard, start_id = view
+    await state.update_data(list_type="view_all", list_start=start_id)
+    logging.debug("Показан полный список животных")
+    await callback.message.answer(text, reply_markup=keyboard)
 
 
 @router.callback_query(lambda c: c.data == "view_filtered")
@@ -760,7 +931,7 @@ async def choose_filters(callback: CallbackQuery, state: FSMContext):
     """Открыть меню выбора фильтров"""
     data = await state.get_data()
     selected_filters = data.get("filters", {})
-    logging.info(f"Текущие фильтры: {selected_filters}")
+    logging.debug("Текущие фильтры: %s", selected_filters)
     await callback.message.edit_text("Выберите фильтр:", reply_markup=filters_keyboard(selected_filters))
 
 
@@ -771,17 +942,26 @@ async def back_to_main(callback: CallbackQuery, state: FSMContext):
     await callback.message.edit_text("Главное меню:", reply_markup=main_keyboard())
 
 
+async def sex_option_counts(state: FSMContext) -> tuple:
+    """Сколько животных даст каждая кнопка пола с учётом уже выбранного возраста"""
+    filters = (await state.get_data()).get("filters", {})
+    by_sex = (await catalog_store.get()).stats.by_sex(filters.get("age_min"), filters.get("age_max"))
+    return by_sex.get("Мужской", 0), by_sex.get("Женский", 0)
+
+
 @router.callback_query(lambda c: c.data == "filter_sex")
 async def start_sex_filter(callback: CallbackQuery, state: FSMContext):
     """Начать выбор пола для интерактивных фильтров"""
-    await callback.message.edit_text("Выберите пол:", reply_markup=sex_keyboard())
+    counts = await sex_option_counts(state)
+    await callback.message.edit_text("Выберите пол:", reply_markup=sex_keyboard(counts=counts))
     await state.set_state(FilterStates.waiting_sex)
 
 
 @router.callback_query(lambda c: c.data == "broadcast_filter_sex")
 async def start_broadcast_sex_filter(callback: CallbackQuery, state: FSMContext):
     """Начать выбор пола для фильтров рассылки"""
-    await callback.message.edit_text("Выберите пол:", reply_markup=sex_keyboard("broadcast_"))
+    counts = await sex_option_counts(state)
+    await callback.message.edit_text("Выберите пол:", reply_markup=sex_keyboard("broadcast_", counts))
     await state.set_state(FilterStates.waiting_sex)
 
 
@@ -807,26 +987,32 @@ async def set_sex(callback: CallbackQuery, state: FSMContext):
 @router.callback_query(lambda c: c.data == "filter_age")
 async def start_age_filter(callback: CallbackQuery, state: FSMContext):
     """Начать выбор возраста для интерактивных фильтров"""
-    max_age = get_max_age()
-    if max_age <= 0:
+    stats = (await catalog_store.get()).stats
+    if stats.max_age is None:
         await callback.answer("Нет доступных возрастов для фильтрации.", show_alert=True)
         return
+    data = await state.get_data()
+    counts = stats.age_option_counts(stats.min_age, stats.max_age, "min", data.get("filters", {}).get("sex"))
     await state.update_data(age_min=None, age_max=None)
     await callback.message.edit_text("Выберите минимальный возраст:",
-                                     reply_markup=age_keyboard(0, max_age, "min"))
+                                     reply_markup=age_keyboard(stats.min_age, stats.max_age, "min",
+                                                               counts=counts))
     await state.set_state(FilterStates.waiting_min_age)
 
 
 @router.callback_query(lambda c: c.data == "broadcast_filter_age")
 async def start_broadcast_age_filter(callback: CallbackQuery, state: FSMContext):
     """Начать выбор возраста для фильтров рассылки"""
-    max_age = get_max_age()
-    if max_age <= 0:
+    stats = (await catalog_store.get()).stats
+    if stats.max_age is None:
         await callback.answer("Нет доступных возрастов для фильтрации.", show_alert=True)
         return
+    data = await state.get_data()
+    counts = stats.age_option_counts(stats.min_age, stats.max_age, "min", data.get("filters", {}).get("sex"))
     await state.update_data(age_min=None, age_max=None)
     await callback.message.edit_text("Выберите минимальный возраст:",
-                                     reply_markup=age_keyboard(0, max_age, "min", "broadcast_"))
+                                     reply_markup=age_keyboard(stats.min_age, stats.max_age, "min", "broadcast_",
+                                                               counts=counts))
     await state.set_state(FilterStates.waiting_min_age)
 
 
@@ -838,13 +1024,16 @@ async def set_min_age(callback: CallbackQuery, state: FSMContext):
     parts = callback.data.split("_")
     min_age = int(parts[-1])  # Возраст всегда последний
     await state.update_data(age_min=min_age)
-    max_age = get_max_age()
-    if max_age <= min_age:
+    stats = (await catalog_store.get()).stats
+    max_age = stats.max_age
+    if max_age is None or max_age <= min_age:
         await callback.answer("Максимальный возраст должен быть больше минимального.", show_alert=True)
         return
     logging.info(f"Установлен минимальный возраст: {min_age}")
+    data = await state.get_data()
+    counts = stats.age_option_counts(min_age, max_age, "max", data.get("filters", {}).get("sex"), min_age)
     await callback.message.edit_text("Выберите максимальный возраст:",
-                                     reply_markup=age_keyboard(min_age, max_age, "max", prefix))
+                                     reply_markup=age_keyboard(min_age, max_age, "max", prefix, counts=counts))
     await state.set_state(FilterStates.waiting_max_age)
 
 
@@ -934,24 +1123,42 @@ async def show_filtered(callback: CallbackQuery, state: FSMContext):
     """Показать животных по интерактивным фильтрам"""
     data = await state.get_data()
     filters = data.get("filters", {})
-    logging.info(f"Применение фильтров: {filters}")
+    logging.debug("Применение фильтров: %s", filters)
 
     if not filters:
         await callback.answer("Выберите хотя бы один фильтр!", show_alert=True)
         return
 
-    animals = get_animals_by_filters(filters)
-    if not animals:
+    view = await list_view("show_filtered", filters)
+    if not view:
         await callback.answer("Животные по этим фильтрам не найдены.", show_alert=True)
         return
 
-    keyboard = InlineKeyboardMarkup(inline_keyboard=[
-        [InlineKeyboardButton(text=f"🐾 {animal['name']}", callback_data=f"animal_{animal['id']}")]
-        for animal in animals
-    ])
-    await state.update_data(list_type="show_filtered", filters=filters)
-    logging.info("Показан отфильтрованный список животных")
-    await callback.message.edit_text("Результаты по фильтрам:", reply_markup=keyboard)
+    text, keyboard, start_id = view
+    await state.update_data(list_type="show_filtered", filters=filters, list_start=start_id)
+    logging.debug("Показан отфильтрованный список животных")
+    await callback.message.edit_text(text, reply_markup=keyboard)
+
+
+@router.callback_query(lambda c: c.data.startswith("list_from_"))
+async def turn_list_page(callback: CallbackQuery, state: FSMContext):
+    """Перелистнуть список животных, отредактировав сообщение на месте"""
+    start_id = int(callback.data.split("_")[-1])
+    data = await state.get_data()
+    list_type = data.get("list_type", "view_all")
+    view = await list_view(list_type, data.get("filters", {}) if list_type == "show_filtered" else {}, start_id)
+    if not view:
+        await callback.answer("Список пуст.", show_alert=True)
+        return
+
+    text, keyboard, start_id = view
+    await state.update_data(list_start=start_id)
+    try:
+        await callback.message.edit_text(text, reply_markup=keyboard)
+    except TelegramBadRequest as e:
+        # Повторное нажатие на ту же кнопку: сообщение не изменилось
+        logging.debug("Страница списка не изменилась: %s", e)
+    await callback.answer()
 
 
 @router.callback_query(lambda c: c.data == "save_broadcast_filters")
@@ -961,7 +1168,7 @@ async def save_broadcast_filters(callback: CallbackQuery, state: FSMContext):
     filters = data.get("filters", {})
     chat_id = data.get("channel_id")
     schedule = data.get("schedule", "0 10 * * *")
-    add_channel(chat_id, filters=filters, schedule=schedule)
+    await add_channel(chat_id, filters=filters, schedule=schedule)
     logging.info(f"Фильтры для канала {chat_id} сохранены: {filters}, расписание: {schedule}")
     await callback.message.edit_text("Фильтры и расписание для канала сохранены.",
                                      reply_markup=broadcast_management_keyboard())
@@ -972,36 +1179,26 @@ async def save_broadcast_filters(callback: CallbackQuery, state: FSMContext):
 async def show_animal_details(callback: CallbackQuery, state: FSMContext):
     """Показать детали животного с красивой разметкой"""
     animal_id = int(callback.data.split("_")[1])
-    animals = get_all_animals()
-    animal = next((a for a in animals if a["id"] == animal_id), None)
-
-    if animal:
-        text = (
-            f"🐾 <b>{animal['name']}</b>\n\n"
-            f"📅 <b>Возраст:</b> {animal['age']}\n"
-            f"⚤ <b>Пол:</b> {animal['sex']}"
-        )
-        keyboard = InlineKeyboardMarkup(inline_keyboard=[
-            [InlineKeyboardButton(text="🌐 Перейти на сайт",
-                                  url=animal['description'] if animal['description'].startswith(
-                                      'http') else 'https://less-homeless.com')],
-            [InlineKeyboardButton(text="🔙 Назад к списку", callback_data="back_to_list")]
-        ])
+    animal = await get_animal(animal_id)
+    card = card_cache.get(animal) if animal else None
+
+    if card:
         try:
-            sent_message = await callback.message.answer_photo(
-                photo=animal['photo_url'],
-                caption=text,
+            sent_message = await send_animal_photo(
+                callback.message.answer_photo,
+                card['photo_url'],
+                caption=card['caption'],
                 parse_mode="HTML",
-                reply_markup=keyboard
+                reply_markup=card['keyboard']
             )
             await state.update_data(card_message_id=sent_message.message_id)
             await callback.message.delete()
         except Exception as e:
             logging.error(f"Ошибка при отправке фото: {e}")
             sent_message = await callback.message.answer(
-                text=text,
+                text=card['caption'],
                 parse_mode="HTML",
-                reply_markup=keyboard
+                reply_markup=card['keyboard']
             )
             await state.update_data(card_message_id=sent_message.message_id)
             await callback.message.delete()
@@ -1009,6 +1206,21 @@ async def show_animal_details(callback: CallbackQuery, state: FSMContext):
         await callback.answer("Информация о животном не найдена.", show_alert=True)
 
 
+@router.inline_query()
+async def inline_search(query: InlineQuery):
+    """Поиск питомцев по имени из любого чата: @бот имя"""
+    snapshot = await catalog_store.get()
+    text = query.query.strip()
+    if text:
+        ids = await search_animal_ids(db, text, INLINE_RESULTS)
+        animals = [animal for animal in map(snapshot.get, ids) if animal is not None]
+    else:
+        # Пустой запрос — последние добавленные животные
+        animals = snapshot.animals[:-INLINE_RESULTS - 1:-1]
+    logging.debug("Inline-запрос %r: найдено %s", text, len(animals))
+    await query.answer([inline_result(animal) for animal in animals], cache_time=60)
+
+
 @router.callback_query(lambda c: c.data == "back_to_list")
 async def back_to_list(callback: CallbackQuery, state: FSMContext):
     """Вернуться к предыдущему списку (полному или отфильтрованному)"""
@@ -1022,42 +1234,30 @@ async def back_to_list(callback: CallbackQuery, state: FSMContext):
         except Exception as e:
             logging.error(f"Ошибка при удалении карточки питомца: {e}")
 
-    if list_type == "show_filtered":
-        filters = data.get("filters", {})
-        animals = get_animals_by_filters(filters)
-        if not animals:
-            await callback.message.answer("Животные по этим фильтрам не найдены.")
-            return
-        keyboard = InlineKeyboardMarkup(inline_keyboard=[
-            [InlineKeyboardButton(text=f"🐾 {animal['name']}", callback_data=f"animal_{animal['id']}")]
-            for animal in animals
-        ])
-        await callback.message.answer("Результаты по фильтрам:", reply_markup=keyboard)
-        logging.info(f"Восстановлен отфильтрованный список с фильтрами: {filters}")
-    else:
-        animals = get_all_animals()
-        if not animals:
-            await callback.message.answer("Животных пока нет в базе.")
-            return
-        keyboard = InlineKeyboardMarkup(inline_keyboard=[
-            [InlineKeyboardButton(text=f"🐾 {animal['name']}", callback_data=f"animal_{animal['id']}")]
-            for animal in animals
-        ])
-        await callback.message.answer("Все доступные животные:", reply_markup=keyboard)
-        logging.info("Восстановлен полный список животных")
+    # Возвращаемся на ту страницу, с которой открыли карточку
+    filters = data.get("filters", {}) if list_type == "show_filtered" else {}
+    view = await list_view(list_type, filters, data.get("list_start"))
+    if not view:
+        await callback.message.answer("Животные по этим фильтрам не найдены." if list_type == "show_filtered"
+                                      else "Животных пока нет в базе.")
+        return
+    text, keyboard, start_id = view
+    await state.update_data(list_start=start_id)
+    await callback.message.answer(text, reply_markup=keyboard)
+    logging.info(f"Восстановлен список {list_type} с фильтрами: {filters}")
 
 
 # ======================== Запуск бота и планировщика ========================
 
 async def main():
     # Инициализация базы данных
-    init_db()
+    await init_db()
 
     # Инициализация и запуск планировщика
     global scheduler
     scheduler.remove_all_jobs()  # Очистка старых задач
     logging.info("Все старые задачи удалены")
-    channels = get_channels()
+    channels = await get_channels()
     for channel in channels:
         if channel["is_active"]:
             try:
@@ -1080,7 +1280,10 @@ async def main():
 
 async def start_bot():
     dp.include_router(router)
-    await dp.start_polling(bot)
+    try:
+        await dp.start_polling(bot)
+    finally:
+        db.close()
 
 
 #     # Запуск бота
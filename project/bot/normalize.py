@@ -0,0 +1,77 @@
+import logging
+import re
+from functools import lru_cache
+
+NORMALIZE_CACHE_SIZE = 4096  # Различных строк возраста и пола, которые помнит нормализатор
+
+# Значения, которыми сайт обозначает отсутствие данных
+UNKNOWN_VALUES = ("не указан", "", "unknown")
+
+# Число (или диапазон — берётся нижняя граница) и следующее за ним слово:
+# "2 года", "8 месяцев", "1 год 3 месяца", "1,5 года", "2-3 года"
+AGE_PART_RE = re.compile(r'(\d+(?:[.,]\d+)?)(?:\s*[-–—]\s*\d+(?:[.,]\d+)?)?\s*([^\W\d_]*)')
+# Начало слова единицы → месяцев в единице; число без единицы считается годами, только если оно первое
+AGE_UNITS = (("мес", 1), ("нед", 0), ("дн", 0), ("год", 12), ("лет", 12), ("г", 12))
+
+# Слова, по которым определяется пол; на сайте приюта пол указан как "Мальчик" / "Девочка".
+# Слово должно начинаться с ключевого (поэтому "female" не считается "male"),
+# однобуквенные сокращения совпадают только целым словом ("м", но не "самка")
+SEX_KEYWORDS = (
+    ("Мужской", ("мальчик", "мужской", "муж", "самец", "male", "boy", "м", "♂")),
+    ("Женский", ("девочка", "женский", "жен", "самка", "female", "girl", "ж", "♀")),
+)
+
+
+def keyword_pattern(keyword):
+    return rf'(?<!\w){re.escape(keyword)}' + (r'(?!\w)' if len(keyword) == 1 else '')
+
+
+SEX_RES = tuple((sex, re.compile('|'.join(map(keyword_pattern, keywords)))) for sex, keywords in SEX_KEYWORDS)
+
+
+# Возраст в месяцах
+@lru_cache(maxsize=NORMALIZE_CACHE_SIZE)
+def age_months(age_str):
+    """Возраст в месяцах из строки сайта или None, если возраст не указан"""
+    if not age_str or age_str.lower() in UNKNOWN_VALUES:
+        return None
+    months = None
+    for number, unit in AGE_PART_RE.findall(age_str.lower()):
+        factor = next((f for prefix, f in AGE_UNITS if unit and unit.startswith(prefix)), None)
+        if factor is None:
+            if months is not None:
+                continue
+            factor = 12
+        months = (months or 0) + float(number.replace(',', '.')) * factor
+    if months is None:
+        logging.debug("Не удалось нормализовать возраст: %s", age_str)
+        return None
+    return int(months)
+
+
+# Нормализация пола
+@lru_cache(maxsize=NORMALIZE_CACHE_SIZE)
+def normalize_sex(sex_str):
+    """Привести значение пола к 'Мужской' или 'Женский'"""
+    if not sex_str or sex_str.lower() in UNKNOWN_VALUES:
+        logging.debug("Пол не указан: %s", sex_str)
+        return None
+    sex_str = sex_str.lower()
+    for sex, keywords_re in SEX_RES:
+        if keywords_re.search(sex_str):
+            return sex
+    logging.debug("Не удалось нормализовать пол: %s", sex_str)
+    return None
+
+
+def normalize_all(values, normalize):
+    """[normalize(value) for value in values], но каждое различное значение разбирается один раз"""
+    known = {value: normalize(value) for value in set(values)}
+    return [known[value] for value in values]
+
+
+def normalized_batch(animals):
+    """Нормализованные колонки animals (age_months, age_years, sex_norm) для списка карточек за один проход"""
+    months = normalize_all([animal['age'] for animal in animals], age_months)
+    sexes = normalize_all([animal['sex'] for animal in animals], normalize_sex)
+    return [(m, None if m is None else m // 12, sex) for m, sex in zip(months, sexes)]
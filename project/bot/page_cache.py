@@ -0,0 +1,116 @@
+import hashlib
+import logging
+from datetime import datetime
+
+
+# Признак того, что страница не изменилась с прошлого обхода
+NOT_MODIFIED = object()
+
+
+def content_hash(text):
+    """Хэш содержимого страницы"""
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+
+# HTTP-кэш страниц с условными запросами (ETag / Last-Modified)
+class PageCache:
+    """Дисковый кэш страниц в таблице http_cache базы данных.
+
+    При revalidate=False условные заголовки не отправляются и страницы всегда считаются изменёнными,
+    но кэш всё равно обновляется (нужно для полного обхода).
+    """
+
+    def __init__(self, conn, revalidate=True):
+        self.conn = conn
+        self.revalidate = revalidate
+        self.hits = 0          # Сервер ответил 304
+        self.same_body = 0     # Ответ 200, но тело не изменилось
+        self.misses = 0        # Новая или изменённая страница
+        self.bytes_saved = 0   # Не скачано благодаря 304
+        self._pending = {}
+        self.conn.execute('''CREATE TABLE IF NOT EXISTS http_cache
+                             (url TEXT PRIMARY KEY,
+                              etag TEXT,
+                              last_modified TEXT,
+                              content_hash TEXT,
+                              body TEXT,
+                              updated_at TEXT)''')
+        self.conn.commit()
+
+    def get(self, url):
+        """Получить запись кэша для url"""
+        row = self.conn.execute(
+            "SELECT etag, last_modified, content_hash, body FROM http_cache WHERE url = ?", (url,)
+        ).fetchone()
+        if not row:
+            return None
+        return {"etag": row[0], "last_modified": row[1], "content_hash": row[2], "body": row[3]}
+
+    def request_headers(self, url):
+        """Заголовки условного запроса для url"""
+        entry = self.get(url) if self.revalidate else None
+        headers = {}
+        if entry:
+            if entry["etag"]:
+                headers['If-None-Match'] = entry["etag"]
+            if entry["last_modified"]:
+                headers['If-Modified-Since'] = entry["last_modified"]
+        return headers
+
+    def body(self, url):
+        """Тело страницы из кэша (с учётом ещё не сохранённых записей)"""
+        if url in self._pending and self._pending[url]["body"] is not None:
+            return self._pending[url]["body"]
+        entry = self.get(url)
+        return entry["body"] if entry else None
+
+    def not_modified(self, url):
+        """Учесть ответ 304"""
+        entry = self.get(url)
+        self.hits += 1
+        if entry and entry["body"]:
+            self.bytes_saved += len(entry["body"].encode('utf-8'))
+        logging.debug("Страница не изменилась (304): %s", url)
+
+    def is_unchanged(self, url, html, etag=None, last_modified=None):
+        """Проверить, совпадает ли тело ответа 200 с закэшированным.
+
+        Новые заголовки и хэш запоминаются и попадают в базу только после commit(),
+        то есть после успешного сохранения данных страницы.
+        """
+        new_hash = content_hash(html)
+        entry = self.get(url)
+        unchanged = self.revalidate and entry is not None and entry["content_hash"] == new_hash
+        self._pending[url] = {
+            "etag": etag,
+            "last_modified": last_modified,
+            "content_hash": new_hash,
+            "body": html,
+        }
+        if unchanged:
+            self.same_body += 1
+            logging.debug("Содержимое страницы не изменилось: %s", url)
+        else:
+            self.misses += 1
+        return unchanged
+
+    def commit(self, urls=None):
+        """Сохранить накопленные записи в базу (все или только для указанных url)"""
+        urls = [url for url in (self._pending if urls is None else urls) if url in self._pending]
+        if not urls:
+            return
+        now = datetime.now().isoformat()
+        entries = [(url, self._pending.pop(url)) for url in urls]
+        self.conn.executemany(
+            '''INSERT OR REPLACE INTO http_cache
+               (url, etag, last_modified, content_hash, body, updated_at)
+               VALUES (?, ?, ?, ?, ?, ?)''',
+            [(url, e["etag"], e["last_modified"], e["content_hash"], e["body"], now) for url, e in entries]
+        )
+        self.conn.commit()
+        logging.debug("Кэш страниц обновлён: %s записей", len(entries))
+
+    def log_stats(self):
+        logging.info(f"Кэш страниц: {self.hits + self.same_body} попаданий "
+                     f"({self.hits} ответов 304, {self.same_body} с тем же содержимым), "
+                     f"{self.misses} промахов, сэкономлено ~{self.bytes_saved // 1024} КБ трафика")
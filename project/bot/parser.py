@@ -1,33 +1,95 @@
 import sqlite3
-import aiohttp
 import asyncio
-from bs4 import BeautifulSoup
-from fake_headers import Headers
+from concurrent.futures import ProcessPoolExecutor
+from bs4 import BeautifulSoup, SoupStrainer, Tag
 from apscheduler.schedulers.asyncio import AsyncIOScheduler
 from datetime import datetime
 import logging
 import os
+import re
+import hashlib
+from datetime import timedelta
+from rate_limit import HostRateLimiter
+from page_cache import PageCache, NOT_MODIFIED
+from log_setup import setup_logging, setup_worker_logging
+from db import configure
+from normalize import normalized_batch
+from catalog import notify_catalog_changed
+from http_client import (FetchError, RetryableStatus, CircuitBreaker, RETRY_STATUSES, parse_retry_after,
+                         with_retries, create_session, header_profile)
 
-# Настройка логирования
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.StreamHandler(),  # Вывод в консоль
-        logging.FileHandler('parser.log')  # Сохранение в файл
-    ]
-)
+# Настройка логирования: запись в консоль и parser.log идёт в фоновом потоке
+setup_logging('parser.log', modules=('parser', 'page_cache', 'rate_limit', 'http_client'))
 
 # Путь к базе данных
 DB_PATH = os.path.join(os.path.dirname(__file__), 'pets.db')  # pets.db в директории скрипта
 
+# Настройки обхода сайта
+BASE_URL = 'https://less-homeless.com/find-your-best-friend-today/page/{}/'
+MAX_PAGES = 100       # Предел страниц, если пагинацию не удалось разобрать: обход идёт до первой пустой страницы
+CONCURRENCY = 4       # Максимум одновременных запросов
+RATE_LIMIT = 2.0      # Запросов в секунду на один хост
+RATE_BURST = 2        # Допустимый всплеск запросов
+PARSE_WORKERS = 2     # Процессов для разбора HTML
+QUEUE_SIZE = 4        # Размер очередей между этапами конвейера
+WRITE_BATCH_SIZE = 100  # Животных в одной транзакции записи
+INCREMENTAL_STOP_PAGES = 1      # Сколько подряд страниц без изменений завершают инкрементальный обход
+FULL_CRAWL_INTERVAL = timedelta(days=7)  # Как часто делать полный обход, чтобы находить удалённых животных
+DETAILS_PER_CRAWL = 50  # Максимум страниц животных, загружаемых за один обход
 
+PAGE_LINK_RE = re.compile(r'/page/(\d+)/?')
+
+
+# Добавление колонки в существующую таблицу (миграция старых баз)
+def ensure_column(c, table, column, decl):
+    columns = [row[1] for row in c.execute(f"PRAGMA table_info({table})")]
+    if column not in columns:
+        c.execute(f"ALTER TABLE {table} ADD COLUMN {column} {decl}")
+        logging.info(f"В таблицу {table} добавлена колонка {column}")
+        return True
+    return False
+
+
+# Колонки полнотекстового поиска и выражение, приводящее «ё» к «е» (unicode61 их различает)
+SEARCH_FIELDS = ('name', 'about', 'breed')
+
+
+def search_values(prefix):
+    return ', '.join(f"replace(replace({prefix}{f}, 'ё', 'е'), 'Ё', 'Е')" for f in SEARCH_FIELDS)
+
+
+# Полнотекстовый индекс animals_fts: ведётся триггерами при любой записи в animals
+def create_search_index(c):
+    exists = c.execute("SELECT 1 FROM sqlite_master WHERE type='table' AND name='animals_fts'").fetchone()
+    # Индекс без копии данных; префиксные индексы дают подсказки уже после первой буквы
+    c.execute(f'''CREATE VIRTUAL TABLE IF NOT EXISTS animals_fts USING fts5
+                  ({', '.join(SEARCH_FIELDS)}, content='', tokenize='unicode61', prefix='1 2 3')''')
+    columns = ', '.join(SEARCH_FIELDS)
+    delete = f"INSERT INTO animals_fts (animals_fts, rowid, {columns}) VALUES ('delete', old.id, {search_values('old.')});"
+    insert = f"INSERT INTO animals_fts (rowid, {columns}) VALUES (new.id, {search_values('new.')});"
+    c.execute(f"CREATE TRIGGER IF NOT EXISTS animals_fts_insert AFTER INSERT ON animals BEGIN {insert} END")
+    c.execute(f"CREATE TRIGGER IF NOT EXISTS animals_fts_delete AFTER DELETE ON animals BEGIN {delete} END")
+    c.execute(f'''CREATE TRIGGER IF NOT EXISTS animals_fts_update AFTER UPDATE OF {columns} ON animals
+                  BEGIN {delete} {insert} END''')
+    if not exists:
+        c.execute(f"INSERT INTO animals_fts (rowid, {columns}) SELECT id, {search_values('')} FROM animals")
+        logging.info("Создан полнотекстовый индекс animals_fts")
+
+
+# Заполнение нормализованных колонок для записей, сохранённых до их появления
+def backfill_normalized(c):
+    rows = c.execute("SELECT id, age, sex FROM animals").fetchall()
+    c.executemany(f"UPDATE animals SET {', '.join(f'{f} = ?' for f in NORMALIZED_FIELDS)} WHERE id = ?",
+                  [(*fields, row[0]) for row, fields in
+                   zip(rows, normalized_batch([{'age': age, 'sex': sex} for _, age, sex in rows]))])
+    logging.info(f"Нормализованы возраст и пол для {len(rows)} записей")
 
 
 # Инициализация базы данных
 def init_db():
     try:
-        conn = sqlite3.connect(DB_PATH)
+        # WAL: бот читает базу, не дожидаясь окончания записи парсера
+        conn = configure(sqlite3.connect(DB_PATH))
         c = conn.cursor()
         c.execute('''CREATE TABLE IF NOT EXISTS animals
                      (id INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -36,6 +98,34 @@ def init_db():
                       sex TEXT,
                       description TEXT,
                       photo_url TEXT)''')
+        # Отпечаток карточки: ссылка на страницу животного + хэш содержимого
+        ensure_column(c, 'animals', 'content_hash', 'TEXT')
+        c.execute("CREATE INDEX IF NOT EXISTS idx_animals_fingerprint ON animals (description, content_hash)")
+        # Подробности со страницы животного и хэш карточки, по которой они получены
+        for column in DETAIL_FIELDS + ('details_hash',):
+            ensure_column(c, 'animals', column, 'TEXT')
+        # Нормализованные возраст и пол: фильтры бота выполняются одним запросом по индексам
+        added = [ensure_column(c, 'animals', column, decl) for column, decl in
+                 (('age_months', 'INTEGER'), ('age_years', 'INTEGER'), ('sex_norm', 'TEXT'))]
+        if any(added):
+            backfill_normalized(c)
+        # Версия строки растёт при каждом изменении записи: по ней бот проверяет закэшированные карточки
+        ensure_column(c, 'animals', 'row_version', 'INTEGER NOT NULL DEFAULT 0')
+        c.execute("CREATE INDEX IF NOT EXISTS idx_animals_sex_age ON animals (sex_norm, age_years)")
+        c.execute("CREATE INDEX IF NOT EXISTS idx_animals_age ON animals (age_years)")
+        create_search_index(c)
+        c.execute("CREATE TABLE IF NOT EXISTS photo_cache (photo_url TEXT PRIMARY KEY, file_id TEXT)")
+        c.execute('''CREATE TABLE IF NOT EXISTS crawl_state
+                     (key TEXT PRIMARY KEY,
+                      value TEXT)''')
+        # Сводка каталога для клавиатур бота: число животных по полу и возрасту
+        stats_missing = not c.execute("SELECT 1 FROM sqlite_master WHERE type='table' AND name='animal_stats'").fetchone()
+        c.execute('''CREATE TABLE IF NOT EXISTS animal_stats
+                     (sex_norm TEXT,
+                      age_years INTEGER,
+                      animals INTEGER NOT NULL)''')
+        if stats_missing:
+            catalog_changed(c)
         conn.commit()
         c.execute("SELECT COUNT(*) FROM animals")
         count = c.fetchone()[0]
@@ -47,62 +137,109 @@ def init_db():
         raise
 
 
-# Асинхронный запрос страницы
-async def fetch_page(session, url):
-    headers = Headers(browser='chrome', os='win').generate()
-    logging.info(f"Отправка запроса на страницу: {url}")
-    try:
+# Асинхронный запрос страницы с повторами и предохранителем
+async def fetch_page(session, url, limiter=None, cache=None, breaker=None):
+    """Вернуть HTML, NOT_MODIFIED или None, если страницы нет (404).
+
+    Временные сбои повторяются; если загрузить страницу так и не удалось, бросается FetchError,
+    чтобы сбой нельзя было спутать с пустой страницей.
+    """
+    async def attempt():
+        headers = header_profile()
+        if cache:
+            headers.update(cache.request_headers(url))
+        if limiter:
+            await limiter.acquire(url)
+        logging.debug("Отправка запроса на страницу: %s", url)
         async with session.get(url, headers=headers) as response:
+            if response.status == 304 and cache:
+                cache.not_modified(url)
+                return NOT_MODIFIED
             if response.status == 200:
-                logging.info(f"Страница успешно получена: {url}")
-                return await response.text()
-            else:
-                logging.error(f"Ошибка HTTP {response.status} при запросе {url}")
+                logging.debug("Страница успешно получена: %s", url)
+                try:
+                    html = await response.text()
+                except UnicodeDecodeError as e:
+                    raise FetchError(url, f"Не удалось декодировать ответ: {e}")
+                if cache and cache.is_unchanged(url, html, response.headers.get('ETag'),
+                                                response.headers.get('Last-Modified')):
+                    return NOT_MODIFIED
+                return html
+            if response.status == 404:
+                logging.info("Страница не найдена (404): %s", url)
                 return None
-    except Exception as e:
-        logging.error(f"Ошибка при запросе {url}: {e}")
-        return None
+            if response.status in RETRY_STATUSES:
+                raise RetryableStatus(response.status, parse_retry_after(response.headers.get('Retry-After')))
+            raise FetchError(url, f"Ошибка HTTP {response.status}", response.status)
 
+    return await with_retries(url, attempt, breaker)
 
-# Парсинг страницы
-async def parse_page(html, page_num):
+
+# Определение числа страниц по блоку пагинации
+def get_page_count(html):
+    """Найти номер последней страницы в ссылках пагинации"""
     if not html:
-        logging.warning(f"Нет данных для парсинга на странице {page_num}")
-        return []
+        return None
+    soup = BeautifulSoup(html, 'lxml')
+    pages = []
+    for link in soup.select('.page-numbers, .pagination a, a.w-pagination-next'):
+        match = PAGE_LINK_RE.search(link.get('href', ''))
+        if match:
+            pages.append(int(match.group(1)))
+        elif link.text.strip().isdigit():
+            pages.append(int(link.text.strip()))
+    if not pages:
+        logging.warning("Пагинация не найдена на первой странице")
+        return None
+    logging.info(f"По пагинации найдено страниц: {max(pages)}")
+    return max(pages)
+
+
+# Строгий фильтр: в дерево попадают только карточки животных, остальная страница не строится
+CARD_STRAINER = SoupStrainer('div', class_='card zs_card')
 
-    logging.info(f"Начало парсинга страницы {page_num}")
-    soup = BeautifulSoup(html, 'html.parser')
+
+def _card_elements(card):
+    """Найти ссылку, фото, имя и значения карточки (те же правила, что у find с class_)"""
+    link = img = name = None
+    values = []
+    for el in card.descendants:
+        if not isinstance(el, Tag):
+            continue
+        classes = el.get('class') or []
+        if el.name == 'div':
+            if 'card__value' in classes:
+                values.append(el)
+            elif img is None and ' '.join(classes) == 'lazyload card__image':
+                img = el
+        elif el.name == 'a':
+            if link is None and ' '.join(classes) == 'card__title w-inline-block':
+                link = el
+        elif el.name == 'h2' and name is None:
+            name = el
+    return link, img, name, values
+
+
+# Извлечение карточек из HTML (синхронно, выполняется в пуле процессов)
+def parse_cards(html, page_num):
+    soup = BeautifulSoup(html, 'lxml', parse_only=CARD_STRAINER)
     cards = soup.find_all('div', class_='card zs_card')
     animals = []
 
-    logging.info(f"Найдено {len(cards)} карточек на странице {page_num}")
+    logging.debug("Найдено %s карточек на странице %s", len(cards), page_num)
     for idx, card in enumerate(cards, 1):
         try:
-            # Извлечение данных
-            pet_link = card.find('a', class_='card__title w-inline-block')
+            # Извлечение данных за один проход по поддереву карточки
+            pet_link, pet_img, pet_name, values = _card_elements(card)
             pet_link = pet_link.get('href') if pet_link else ''
-            logging.debug(f"Карточка {idx}: Ссылка = {pet_link}")
-
-            pet_img = card.find('div', class_='lazyload card__image')
             pet_img = pet_img.get('data-bg') if pet_img else ''
-            logging.debug(f"Карточка {idx}: Фото = {pet_img}")
-
-            pet_name = card.find('h2')
             pet_name = pet_name.text.strip() if pet_name else 'Без имени'
-            logging.debug(f"Карточка {idx}: Имя = {pet_name}")
 
-            # Извлечение возраста с проверкой
-            pet_age = card.find('div', class_='card__value')
-            pet_age = pet_age.text.strip() if pet_age and pet_age.text.strip() else 'Не указан'
-            if pet_age == 'Не указан':
-                logging.info(f"Карточка {idx}: Возраст не указан для {pet_name}")
-            else:
-                logging.debug(f"Карточка {idx}: Возраст = {pet_age}")
-
-            # Попытка извлечь пол
-            sex_elements = card.find_all('div', class_='card__value')
-            pet_sex = sex_elements[1].text.strip() if len(sex_elements) > 1 else 'Не указан'
-            logging.debug(f"Карточка {idx}: Пол = {pet_sex}")
+            # Возраст — первое значение карточки, пол — второе
+            pet_age = values[0].text.strip() if values else ''
+            pet_age = pet_age or 'Не указан'
+            pet_sex = values[1].text.strip() if len(values) > 1 else 'Не указан'
+            logging.debug("Карточка %s: %s, %s, %s, %s, %s", idx, pet_name, pet_age, pet_sex, pet_link, pet_img)
 
             animals.append({
                 'name': pet_name,
@@ -111,76 +248,498 @@ async def parse_page(html, page_num):
                 'photo_url': pet_img,
                 'description': pet_link
             })
-            logging.info(f"Карточка {idx} успешно спарсена: {pet_name}")
         except (AttributeError, IndexError) as e:
             logging.warning(f"Ошибка при парсинге карточки {idx} на странице {page_num}: {e}")
             continue
 
-    logging.info(f"Парсинг страницы {page_num} завершён, найдено {len(animals)} животных")
     return animals
 
 
-# Сохранение в базу данных
+# Парсинг страницы вне цикла событий, чтобы не блокировать обработчики бота
+async def parse_page(html, page_num, executor=None):
+    if not html:
+        logging.warning(f"Нет данных для парсинга на странице {page_num}")
+        return []
+
+    logging.debug("Начало парсинга страницы %s", page_num)
+    loop = asyncio.get_running_loop()
+    animals = await loop.run_in_executor(executor, parse_cards, html, page_num)
+    logging.debug("Парсинг страницы %s завершён, найдено %s животных", page_num, len(animals))
+    return animals
+
+
+# Поля страницы животного: начало подписи на сайте → колонка в базе
+DETAIL_LABELS = {
+    'порода': 'breed',
+    'окрас': 'color',
+    'прививк': 'vaccinated',
+    'вакцин': 'vaccinated',
+    'стерилиз': 'sterilized',
+    'кастрац': 'sterilized',
+}
+DETAIL_FIELDS = ('about', 'breed', 'color', 'vaccinated', 'sterilized')
+
+
+# Извлечение подробностей со страницы животного (синхронно, выполняется в пуле процессов)
+def parse_details(html):
+    soup = BeautifulSoup(html, 'lxml')
+    details = dict.fromkeys(DETAIL_FIELDS)
+
+    # Характеристики: подпись (*__label) и следующее за ней значение
+    for label in soup.find_all(class_=re.compile(r'__label$')):
+        value = label.find_next_sibling()
+        if value is None:
+            continue
+        label_text = label.get_text(' ', strip=True).lower()
+        field = next((f for prefix, f in DETAIL_LABELS.items() if label_text.startswith(prefix)), None)
+        if field and not details[field]:
+            details[field] = value.get_text(' ', strip=True) or None
+
+    # Описание: текстовый блок страницы, иначе og:description
+    about = soup.select_one('.w-richtext')
+    if about and about.get_text(strip=True):
+        details['about'] = about.get_text('\n', strip=True)
+    else:
+        meta = soup.find('meta', attrs={'property': 'og:description'})
+        if meta and meta.get('content', '').strip():
+            details['about'] = meta['content'].strip()
+    return details
+
+
+# Поля, по которым определяется, изменилось ли животное
+ANIMAL_FIELDS = ('age', 'sex', 'description', 'photo_url', 'content_hash')
+# Колонки, вычисляемые из карточки при записи (см. normalize.py)
+NORMALIZED_FIELDS = ('age_months', 'age_years', 'sex_norm')
+STORED_FIELDS = ANIMAL_FIELDS + NORMALIZED_FIELDS
+
+
+def card_hash(animal):
+    """Хэш содержимого карточки животного"""
+    data = '\x1f'.join(animal[key] or '' for key in ('name', 'age', 'sex', 'description', 'photo_url'))
+    return hashlib.sha1(data.encode('utf-8')).hexdigest()
+
+
+def count_known_cards(conn, animals):
+    """Сколько карточек уже есть в базе без изменений (поиск по индексу отпечатков)"""
+    if not animals:
+        return 0
+    placeholders = ', '.join('(?, ?)' for _ in animals)
+    params = [value for a in animals for value in (a['description'], card_hash(a))]
+    return conn.execute(f"SELECT COUNT(*) FROM animals WHERE (description, content_hash) IN (VALUES {placeholders})",
+                        params).fetchone()[0]
+
+
+def catalog_changed(c):
+    """Пересчитать animal_stats и увеличить catalog_version (вызывается внутри транзакции записи)"""
+    c.execute("DELETE FROM animal_stats")
+    c.execute('''INSERT INTO animal_stats (sex_norm, age_years, animals)
+                 SELECT sex_norm, age_years, COUNT(*) FROM animals GROUP BY sex_norm, age_years''')
+    # По версии бот понимает, что закэшированные данные каталога устарели
+    c.execute('''INSERT INTO crawl_state (key, value) VALUES ('catalog_version', 1)
+                 ON CONFLICT (key) DO UPDATE SET value = value + 1''')
+    # Бот в том же процессе сбрасывает кэши сразу; до его следующего запроса транзакция уже зафиксирована
+    notify_catalog_changed()
+
+
+def get_crawl_state(conn, key):
+    row = conn.execute("SELECT value FROM crawl_state WHERE key = ?", (key,)).fetchone()
+    return row[0] if row else None
+
+
+def set_crawl_state(conn, key, value):
+    conn.execute("INSERT OR REPLACE INTO crawl_state (key, value) VALUES (?, ?)", (key, value))
+    conn.commit()
+
+
+# Сохранение в базу данных одной транзакцией через staging-таблицу
 async def save_to_db(animals, conn):
+    """Загрузить пачку животных в staging-таблицу и обновить animals на месте.
+
+    Id существующих записей не меняются, поэтому уже отправленные кнопки animal_<id> остаются рабочими.
+    Имена запоминаются в crawl_seen, чтобы в конце полного обхода удалить пропавших животных.
+    Возвращает словарь со статистикой или None при ошибке.
+    """
+    # Нормализованные поля сравниваются тоже: после исправления нормализации записи обновятся
+    changed = ' OR '.join(f'animals.{f} IS NOT staging_animals.{f}' for f in STORED_FIELDS)
+    columns = ', '.join(('name',) + STORED_FIELDS)
     try:
         c = conn.cursor()
-        added = 0
-        updated = 0
-        skipped = 0
-        logging.info(f"Сохранение {len(animals)} животных в базу данных")
+        logging.debug("Сохранение %s животных в базу данных", len(animals))
+        # Блокировка записи берётся сразу, чтобы не получить SQLITE_BUSY посреди транзакции
+        c.execute("BEGIN IMMEDIATE")
+        c.execute('''CREATE TEMP TABLE IF NOT EXISTS staging_animals
+                     (name TEXT PRIMARY KEY,
+                      age TEXT,
+                      sex TEXT,
+                      description TEXT,
+                      photo_url TEXT,
+                      content_hash TEXT,
+                      age_months INTEGER,
+                      age_years INTEGER,
+                      sex_norm TEXT)''')
+        c.execute("CREATE TEMP TABLE IF NOT EXISTS crawl_seen (name TEXT PRIMARY KEY)")
+        c.execute("DELETE FROM staging_animals")
+        # При повторе имени в обходе остаётся последняя карточка, как и раньше
+        c.executemany(f'''INSERT OR REPLACE INTO staging_animals ({columns})
+                          VALUES ({', '.join('?' for _ in ('name',) + STORED_FIELDS)})''',
+                      [(a['name'], a['age'], a['sex'], a['description'], a['photo_url'], card_hash(a), *fields)
+                       for a, fields in zip(animals, normalized_batch(animals))])
 
-        for animal in animals:
-            try:
-                c.execute('''INSERT OR REPLACE INTO animals 
-                            (name, age, sex, description, photo_url)
-                            VALUES (?, ?, ?, ?, ?)''',
-                          (animal['name'], animal['age'], animal['sex'],
-                           animal['description'], animal['photo_url']))
-                c.execute('SELECT COUNT(*) FROM animals WHERE name = ?', (animal['name'],))
-                exists = c.fetchone()[0]
-                if exists > 1:
-                    updated += 1
-                else:
-                    added += 1
-                logging.debug(f"Обработано животное: {animal['name']}")
-            except sqlite3.IntegrityError as e:
-                logging.warning(f"Пропущено животное {animal['name']} из-за ошибки: {e}")
-                skipped += 1
-                continue
+        staged = c.execute("SELECT COUNT(*) FROM staging_animals").fetchone()[0]
+        added = c.execute('''SELECT COUNT(*) FROM staging_animals
+                             WHERE name NOT IN (SELECT name FROM animals)''').fetchone()[0]
+        updated = c.execute(f'''SELECT COUNT(*) FROM staging_animals
+                                JOIN animals ON animals.name = staging_animals.name
+                                WHERE {changed}''').fetchone()[0]
+        stats = {
+            'added': added,
+            'updated': updated,
+            'unchanged': staged - added - updated,
+            'skipped': len(animals) - staged,
+        }
+
+        # Сменилось фото — сохранённый в Telegram file_id больше не соответствует животному
+        c.execute('''DELETE FROM photo_cache WHERE photo_url IN
+                         (SELECT animals.photo_url FROM animals
+                          JOIN staging_animals ON animals.name = staging_animals.name
+                          WHERE animals.photo_url IS NOT staging_animals.photo_url)''')
 
+        # Изменившиеся записи обновляются на месте, новые вставляются, остальные не трогаются
+        # Row-value UPDATE вместо UPDATE … FROM: тот требует SQLite 3.33, а этот работает с 3.15
+        c.execute(f'''UPDATE animals SET
+                          ({', '.join(STORED_FIELDS)}) = (SELECT {', '.join(STORED_FIELDS)} FROM staging_animals
+                                                          WHERE staging_animals.name = animals.name),
+                          row_version = row_version + 1
+                      WHERE name IN (SELECT staging_animals.name FROM staging_animals
+                                     JOIN animals ON animals.name = staging_animals.name
+                                     WHERE {changed})''')
+        c.execute(f'''INSERT INTO animals ({columns})
+                      SELECT {columns} FROM staging_animals
+                      WHERE name NOT IN (SELECT name FROM animals)''')
+
+        c.execute("INSERT OR IGNORE INTO crawl_seen (name) SELECT name FROM staging_animals")
+        c.execute("DELETE FROM staging_animals")
+        if added or updated:
+            catalog_changed(c)
         conn.commit()
-        logging.info(f"Результат сохранения: {added} добавлено, {updated} обновлено, {skipped} пропущено")
-        c.execute("SELECT COUNT(*) FROM animals")
-        total = c.fetchone()[0]
-        logging.info(f"Общее количество записей в таблице animals: {total}")
+        logging.info("Результат сохранения: %(added)s добавлено, %(updated)s обновлено, "
+                     "%(unchanged)s без изменений, %(skipped)s пропущено (повторы)", stats)
+        return stats
     except sqlite3.Error as e:
+        conn.rollback()
         logging.error(f"Ошибка при сохранении в базу данных: {e}")
+        return None
+
+
+# Удаление животных, пропавших с сайта
+def remove_missing_animals(conn):
+    """Удалить животных, не встретившихся в полном обходе (по таблице crawl_seen)"""
+    try:
+        c = conn.cursor()
+        c.execute("CREATE TEMP TABLE IF NOT EXISTS crawl_seen (name TEXT PRIMARY KEY)")
+        if not c.execute("SELECT COUNT(*) FROM crawl_seen").fetchone()[0]:
+            return 0
+        c.execute('''DELETE FROM photo_cache WHERE photo_url IN
+                         (SELECT photo_url FROM animals WHERE name NOT IN (SELECT name FROM crawl_seen))''')
+        c.execute("DELETE FROM animals WHERE name NOT IN (SELECT name FROM crawl_seen)")
+        removed = c.rowcount
+        if removed:
+            catalog_changed(conn.cursor())
+        conn.commit()
+        logging.info(f"Удалено животных, пропавших с сайта: {removed}")
+        return removed
+    except sqlite3.Error as e:
+        conn.rollback()
+        logging.error(f"Ошибка при удалении пропавших животных: {e}")
+        return 0
+
+
+# Источник страниц: сначала первая, затем остальные окном из concurrency запросов
+async def iter_pages(session, limiter, cache, concurrency, crawl, breaker=None):
+    async def fetch_numbered(page):
+        # Сбой загрузки передаётся дальше как объект FetchError, а не как пустая страница
+        url = BASE_URL.format(page)
+        try:
+            return page, url, await fetch_page(session, url, limiter, cache, breaker)
+        except FetchError as e:
+            return page, url, e
+
+    first_page = await fetch_numbered(1)
+    yield first_page
+    first_url, first_html = first_page[1:]
+    if isinstance(first_html, FetchError):
+        logging.error("Первая страница не загружена, обход прерван")
+        return
+    if not first_html:
+        logging.info("Нет данных на первой странице, завершаем парсинг")
+        return
+
+    # Пагинация берётся из кэша, если страница не изменилась
+    crawl['page_count'] = get_page_count(cache.body(first_url))
+    max_pages = crawl['page_count'] or MAX_PAGES
+    if crawl['page_count'] is None:
+        logging.warning("Число страниц неизвестно: конец списка определяется по первой странице без карточек")
+    logging.info(f"Парсинг начат, страниц: {max_pages}, параллельных запросов: {concurrency}, "
+                 f"лимит: {limiter.rate} запр/с")
+
+    if crawl['incremental']:
+        # Страницы идут по порядку: следующая запрашивается только после проверки предыдущей
+        for page in range(2, max_pages + 1):
+            await crawl['page_checked'].wait()
+            crawl['page_checked'].clear()
+            if crawl['stop']:
+                return
+            yield await fetch_numbered(page)
+        return
+
+    next_page = 2
+    pending = set()
+    try:
+        # crawl['stop'] в полном обходе означает, что найден конец списка
+        while (next_page <= max_pages and not crawl['stop']) or pending:
+            while next_page <= max_pages and len(pending) < concurrency and not crawl['stop']:
+                pending.add(asyncio.create_task(fetch_numbered(next_page)))
+                next_page += 1
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                yield task.result()
+    finally:
+        for task in pending:
+            task.cancel()
+
+
+# Этап 1: загрузка страниц в ограниченную очередь
+async def fetch_stage(pages, page_queue, workers):
+    async for item in pages:
+        await page_queue.put(item)
+    for _ in range(workers):
+        await page_queue.put(None)
 
 
-# Основная функция парсинга
-async def main():
+# Этап 2: разбор страниц в пуле процессов
+async def parse_stage(page_queue, parsed_queue, executor):
+    while (item := await page_queue.get()) is not None:
+        page, url, html = item
+        # Неизменённые и не загруженные страницы передаются дальше без разбора
+        if html is NOT_MODIFIED or isinstance(html, FetchError):
+            animals = html
+        else:
+            animals = await parse_page(html, page, executor)
+        await parsed_queue.put((page, url, animals))
+    await parsed_queue.put(None)
+
+
+# Этап 3: запись пачками, каждая пачка — отдельная транзакция
+async def write_stage(parsed_queue, conn, cache, workers, crawl):
+    batch, urls = [], []
+
+    async def flush():
+        if not batch:
+            return
+        stats = await save_to_db(batch, conn)
+        if stats is None:
+            crawl['failed'] = True
+        else:
+            # Кэш страницы обновляется только после того, как её данные сохранены
+            cache.commit(urls)
+            for key, value in stats.items():
+                crawl['stats'][key] += value
+        batch.clear()
+        urls.clear()
+
+    def check_unchanged(page, unchanged):
+        # В инкрементальном режиме обход останавливается после серии страниц без изменений
+        if not crawl['incremental']:
+            return
+        crawl['unchanged_streak'] = crawl['unchanged_streak'] + 1 if unchanged else 0
+        if crawl['unchanged_streak'] >= INCREMENTAL_STOP_PAGES:
+            logging.info(f"Страниц подряд без изменений: {crawl['unchanged_streak']}, "
+                         f"инкрементальный обход остановлен на странице {page}")
+            crawl['stop'] = True
+
+    finished = 0
+    while finished < workers:
+        item = await parsed_queue.get()
+        if item is None:
+            finished += 1
+            continue
+        page, url, animals = item
+        if animals is NOT_MODIFIED:
+            logging.info("Страница %s не изменилась, пропускаем", page)
+            crawl['skipped_pages'] += 1
+            cache.commit([url])
+            check_unchanged(page, True)
+        elif isinstance(animals, FetchError):
+            # Сбой загрузки — не пустая страница: кэш не обновляется, обход не считается полным
+            logging.error("Страница %s не загружена: %s", page, animals)
+            crawl['failed_pages'].append(page)
+            check_unchanged(page, False)
+        elif not animals:
+            logging.info("Нет данных на странице %s", page)
+            crawl['empty_pages'].append(page)
+            cache.commit([url])
+            if crawl['page_count'] is None:
+                # Без пагинации страница без карточек (или 404) — конец списка
+                logging.info("Конец списка: страница %s", page)
+                crawl['stop'] = True
+            else:
+                check_unchanged(page, False)
+        else:
+            check_unchanged(page, count_known_cards(conn, animals) == len(animals))
+            crawl['last_card_page'] = max(crawl['last_card_page'], page)
+            batch.extend(animals)
+            urls.append(url)
+            crawl['animals'] += len(animals)
+            logging.info("Страница %s обработана, найдено %s животных, всего: %s", page, len(animals), crawl['animals'])
+            # Пишем, когда набралась пачка или новых страниц пока нет — так бот видит данные сразу
+            if len(batch) >= WRITE_BATCH_SIZE or parsed_queue.empty():
+                await flush()
+        crawl['page_checked'].set()
+    await flush()
+
+
+# Дообогащение: загрузка страниц животных, у которых изменилась карточка
+async def enrich_details(session, conn, limiter, executor, concurrency=CONCURRENCY, limit=DETAILS_PER_CRAWL,
+                         breaker=None):
+    """Загрузить страницы животных, чья карточка изменилась с прошлого обогащения, и сохранить подробности"""
+    rows = conn.execute('''SELECT id, description, content_hash FROM animals
+                           WHERE description LIKE 'http%' AND details_hash IS NOT content_hash
+                           ORDER BY id DESC LIMIT ?''', (limit,)).fetchall()
+    if not rows:
+        logging.info("Страницы животных не изменились, обогащение не требуется")
+        return 0
+
+    logging.info(f"Обогащение: загрузка {len(rows)} страниц животных")
+    semaphore = asyncio.Semaphore(concurrency)
+    loop = asyncio.get_running_loop()
+
+    async def enrich(animal_id, url, card_hash_value):
+        async with semaphore:
+            try:
+                html = await fetch_page(session, url, limiter, breaker=breaker)
+            except FetchError as e:
+                # Временная ошибка: подробности догрузятся в следующий обход, details_hash не обновляется
+                logging.warning("Страница животного не загружена: %s", e)
+                return None
+        details = None
+        if html:
+            try:
+                details = await loop.run_in_executor(executor, parse_details, html)
+            except Exception as e:
+                logging.warning(f"Ошибка при разборе страницы животного {url}: {e}")
+        if not details or not any(details.values()):
+            # Страницы нет (404) или на ней ничего не нашлось: повторять до изменения карточки незачем
+            logging.info("Подробностей на странице животного нет: %s", url)
+            return False, (card_hash_value, animal_id, card_hash_value)
+        return True, (*(details[f] for f in DETAIL_FIELDS), card_hash_value, animal_id, card_hash_value)
+
+    outcomes = [r for r in await asyncio.gather(*(enrich(*row) for row in rows)) if r]
+    results = [values for found, values in outcomes if found]
+    missing = [values for found, values in outcomes if not found]
+    try:
+        # Условие по content_hash не даёт затереть карточку, изменившуюся во время загрузки
+        conn.executemany(f'''UPDATE animals SET {', '.join(f'{f} = ?' for f in DETAIL_FIELDS)}, details_hash = ?,
+                                                row_version = row_version + 1
+                             WHERE id = ? AND content_hash = ?''', results)
+        # Для страниц без подробностей только отмечается, что карточка уже обработана
+        conn.executemany("UPDATE animals SET details_hash = ? WHERE id = ? AND content_hash = ?", missing)
+        if results:
+            catalog_changed(conn.cursor())
+        conn.commit()
+    except sqlite3.Error as e:
+        conn.rollback()
+        logging.error(f"Ошибка при сохранении подробностей: {e}")
+        return 0
+    logging.info(f"Обогащение завершено: {len(results)} из {len(rows)} страниц, без подробностей: {len(missing)}")
+    return len(results)
+
+
+# Выбор режима: полный обход раз в FULL_CRAWL_INTERVAL, в остальное время — инкрементальный
+def is_full_crawl_due(conn):
+    last_full = get_crawl_state(conn, 'last_full_crawl')
+    if not last_full:
+        return True
+    return datetime.now() - datetime.fromisoformat(last_full) >= FULL_CRAWL_INTERVAL
+
+
+# Основная функция парсинга: потоковый конвейер загрузка → разбор → запись
+async def main(concurrency=CONCURRENCY, rate_limit=RATE_LIMIT, incremental=None):
     logging.info("Запуск парсинга")
     conn = init_db()
-    all_animals = []
-    base_url = 'https://less-homeless.com/find-your-best-friend-today/page/{}/'
-    max_pages = 16
-
-    logging.info(f"Парсинг начат, максимум страниц: {max_pages}")
-    async with aiohttp.ClientSession() as session:
-        for page in range(1, max_pages + 1):
-            url = base_url.format(page)
-            html = await fetch_page(session, url)
-            animals = await parse_page(html, page)
-            if not animals:
-                logging.info(f"Нет данных на странице {page}, завершаем парсинг")
-                break
-            all_animals.extend(animals)
-            logging.info(f"Страница {page} обработана, найдено {len(animals)} животных, всего: {len(all_animals)}")
-            await asyncio.sleep(1)  # Задержка для избежания блокировки
-
-    await save_to_db(all_animals, conn)
-    conn.close()
-    logging.info(f"Парсинг завершён: {datetime.now()}, всего обработано {len(all_animals)} животных")
+    if incremental is None:
+        incremental = not is_full_crawl_due(conn)
+    logging.info(f"Режим обхода: {'инкрементальный' if incremental else 'полный'}")
+    # Полный обход разбирает все страницы заново, чтобы увидеть всех животных на сайте
+    cache = PageCache(conn, revalidate=incremental)
+    limiter = HostRateLimiter(rate_limit, RATE_BURST)
+    breaker = CircuitBreaker()
+    crawl = {
+        'incremental': incremental,
+        'page_count': None,
+        'animals': 0,
+        'skipped_pages': 0,
+        'empty_pages': [],
+        'last_card_page': 0,
+        'unchanged_streak': 0,
+        'stop': False,
+        'page_checked': asyncio.Event(),
+        'failed': False,
+        'failed_pages': [],
+        'stats': {'added': 0, 'updated': 0, 'unchanged': 0, 'skipped': 0},
+    }
+    page_queue = asyncio.Queue(maxsize=QUEUE_SIZE)
+    parsed_queue = asyncio.Queue(maxsize=QUEUE_SIZE)
+
+    try:
+        with ProcessPoolExecutor(max_workers=PARSE_WORKERS, initializer=setup_worker_logging) as executor:
+            async with create_session(limit_per_host=concurrency) as session:
+                pages = iter_pages(session, limiter, cache, concurrency, crawl, breaker)
+                stages = [
+                    asyncio.create_task(fetch_stage(pages, page_queue, PARSE_WORKERS)),
+                    *(asyncio.create_task(parse_stage(page_queue, parsed_queue, executor))
+                      for _ in range(PARSE_WORKERS)),
+                    asyncio.create_task(write_stage(parsed_queue, conn, cache, PARSE_WORKERS, crawl)),
+                ]
+                try:
+                    await asyncio.gather(*stages)
+                except BaseException:
+                    for task in stages:
+                        task.cancel()
+                    await asyncio.gather(*stages, return_exceptions=True)
+                    raise
+
+                # Второй этап: подробности только для изменившихся карточек, с тем же ограничением частоты
+                await enrich_details(session, conn, limiter, executor, concurrency, breaker=breaker)
+
+        # Обход полный, только если все страницы списка заново разобраны и сохранены. Без пагинации список
+        # заканчивается первой пустой страницей, и после неё не должно быть страниц с карточками
+        if crawl['page_count'] is not None:
+            listing_complete = not crawl['empty_pages']
+        else:
+            end_page = min(crawl['empty_pages'], default=None)
+            listing_complete = end_page is not None and crawl['last_card_page'] < end_page
+            if not listing_complete and not incremental:
+                logging.warning("Конец списка не найден: обход не считается полным, удаление пропавших животных "
+                                "и инкрементальный режим недоступны")
+        complete = (not incremental and listing_complete and not crawl['failed']
+                    and not crawl['skipped_pages'] and not crawl['failed_pages'])
+        removed = 0
+        if complete:
+            removed = remove_missing_animals(conn)
+            set_crawl_state(conn, 'last_full_crawl', datetime.now().isoformat())
+        elif crawl['failed_pages']:
+            logging.warning(f"Обход неполный, не загружены страницы: {sorted(crawl['failed_pages'])}; "
+                            f"удаление пропавших животных пропущено")
+        stats = crawl['stats']
+        logging.info(f"Итог обхода: {stats['added']} добавлено, {stats['updated']} обновлено, "
+                     f"{stats['unchanged']} без изменений, {removed} удалено, "
+                     f"{stats['skipped']} пропущено (повторы)")
+        cache.log_stats()
+        total = conn.execute("SELECT COUNT(*) FROM animals").fetchone()[0]
+        logging.info(f"Общее количество записей в таблице animals: {total}")
+    finally:
+        conn.close()
+    logging.info(f"Парсинг завершён: {datetime.now()}, всего обработано {crawl['animals']} животных")
 
 
 # Настройка планировщика
@@ -0,0 +1,50 @@
+import asyncio
+import time
+from urllib.parse import urlsplit
+
+
+# Ограничитель частоты запросов по алгоритму "token bucket"
+class TokenBucket:
+    """Ведро токенов: не более rate запросов в секунду с допустимым всплеском burst"""
+
+    def __init__(self, rate: float, burst: int = 1):
+        if rate <= 0:
+            raise ValueError("rate должен быть больше нуля")
+        self.rate = rate
+        self.capacity = max(1, burst)
+        self.tokens = float(self.capacity)
+        self.updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    async def acquire(self):
+        """Дождаться свободного токена и забрать его"""
+        # Лок гарантирует, что ожидающие получают токены по очереди (FIFO)
+        async with self._lock:
+            self._refill()
+            if self.tokens < 1:
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+                self._refill()
+            self.tokens -= 1
+
+
+class HostRateLimiter:
+    """Набор ведер токенов — отдельное ведро на каждый хост"""
+
+    def __init__(self, rate: float, burst: int = 1):
+        self.rate = rate
+        self.burst = burst
+        self._buckets = {}
+
+    def bucket(self, url: str) -> TokenBucket:
+        host = urlsplit(url).netloc
+        if host not in self._buckets:
+            self._buckets[host] = TokenBucket(self.rate, self.burst)
+        return self._buckets[host]
+
+    async def acquire(self, url: str):
+        await self.bucket(url).acquire()